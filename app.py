@@ -1,44 +1,61 @@
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import spacy
-from spellchecker import SpellChecker
 import re
-from tempfile import NamedTemporaryFile
 import os
+import uuid
+import threading
 import requests
 from urllib.parse import urlparse
-from pydub import AudioSegment
 import openai
-import fasttext
-from pyannote.audio import Pipeline
+from diarization_pool import DIARIZATION_MODEL, get_diarization_pool, warm_up_from_env
+from chunk_scheduler import get_chunk_scheduler
+from asr_backends import get_asr_backend, iter_groups
+from audio_array import load_audio_array
+from ingest import STREAM_CHUNK_SIZE, AudioTooLarge, IngestError, ingest_upload, ingest_url, open_url_stream, read_stream
+from google_streaming import GoogleStreamingRecognizer
+from result_cache import cache_key, get_result_cache
+from jobs import JobManager, JobStore, NullProgress, job_status
+from batch_transcription import ContentDeduplicator, get_batch_executor, submit_diarization
+from spellcheck import max_spellcheck_batch_size, max_spellcheck_processes
+from resources import preload_from_env, registry
+from translation import get_translation_service, translation_stats
+from language_id import combine, get_language_identifier, language_label, language_name, prediction_dicts
+from speaker_index import get_speaker_index, speaker_index_config, speaker_index_stats
+from streaming_diarization import (
+    StreamingDiarizer,
+    audio_duration,
+    embeddings_by_label,
+    streaming_options_from_env,
+    use_streaming_diarization,
+)
+from tracing import Trace, activate, count, current_trace, metrics, span
+from vad import detect_speech, vad_options_from_env
+from resources import current_rss_bytes
+from turn_packing import (
+    Turn,
+    needs_word_timestamps,
+    packing_options_from_env,
+    plan_batches,
+    split_batch_transcript,
+    turns_from_diarization,
+)
 from dotenv import load_dotenv
 import json
 from collections import OrderedDict
-from langdetect import detect
-from deep_translator import GoogleTranslator
+from concurrent.futures import Future, as_completed
 
 load_dotenv()
 
 openai.api_key = os.getenv("TRANSCRIPTION_API")
-nlp = spacy.load('en_core_web_sm')
-spell = SpellChecker()
-
-model_path = 'Sample//lid.176.bin'
-fasttext_model = fasttext.load_model(model_path)
 
 app = Flask(__name__)
 CORS(app)
 
-# Language mappings
-LANGUAGE_MAP = {
-    "en": "English", "fr": "French", "hi": "Hindi", "es": "Spanish", "de": "German",
-    "it": "Italian", "pt": "Portuguese", "ru": "Russian", "zh-cn": "Chinese", "ja": "Japanese",
-    "ko": "Korean", "ar": "Arabic", "tr": "Turkish", "nl": "Dutch", "el": "Greek",
-    "sv": "Swedish", "pl": "Polish", "iw": "Hebrew", "bn": "Bengali", "th": "Thai",
-    "id": "Indonesian", "vi": "Vietnamese", "ro": "Romanian", "fa": "Persian", "uk": "Ukrainian",
-    "ur": "Urdu", "ta": "Tamil", "te": "Telugu", "ms": "Malay", "hu": "Hungarian"
-}
-language_mapping = LANGUAGE_MAP  # For fastText mapping reuse
+# Models load on first use; PRELOAD_MODELS loads them now (before fork under gunicorn --preload)
+preload_from_env()
+warm_up_from_env(auth_token=os.getenv("USER_AUTH_TOKEN"))
+
+NO_PROGRESS = NullProgress()
 
 def extract_filename_from_url(url):
     parsed_url = urlparse(url)
@@ -46,82 +63,184 @@ def extract_filename_from_url(url):
     file_name = re.sub(r'[-\s]+', '_', file_name).strip('_')
     return file_name
 
-def diarize_audio(file_path):
+def diarize_audio(audio):
     try:
-        print(f"Processing file: {file_path}")
-        pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=os.getenv("USER_AUTH_TOKEN"))
-        diarization = pipeline({'uri': 'filename', 'audio': file_path})
-        return diarization
+        print(f"Processing file: {audio.path}")
+        pool = get_diarization_pool(auth_token=os.getenv("USER_AUTH_TOKEN"))
+        # pyannote gets the already loaded samples rather than decoding the file again
+        with span("diarize", audio_seconds=audio.duration):
+            diarization, embeddings = pool.diarize(audio.pipeline_input(), return_embeddings=True)
+        return diarization, embeddings_by_label(diarization.labels(), embeddings)
     except Exception as e:
         print(f"Error during diarization: {e}")
-        return None
-
-def split_audio_by_speaker(file_path, diarization):
-    audio = AudioSegment.from_wav(file_path)
-    chunks = []
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        start_time = int(turn.start * 1000)
-        end_time = int(turn.end * 1000)
-        chunk = audio[start_time:end_time]
-        chunks.append((chunk, speaker, turn.start))
-    return chunks
-
-def transcribe_chunk(chunk):
-    try:
-        with NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
-            chunk.export(temp_wav.name, format="wav")
-            with open(temp_wav.name, 'rb') as audio_file:
-                response = openai.Audio.transcribe(model="whisper-1", file=audio_file, response_format="json")
-                transcription = response.get('text', '')
-            os.remove(temp_wav.name)
-        return transcription
-    except Exception as e:
-        print(f"Error during chunk transcription: {e}")
+        return None, {}
+
+def label_speakers(speakers, embeddings, speaker_mapping, speaker_ids):
+    # Labels this call's new `speakers` in order. With SPEAKER_INDEX_PATH set each
+    # one is looked up in the cross-call speaker index and keeps its stable id
+    # ("Speaker 17"); otherwise, or without a usable embedding, it is "Caller N".
+    index = get_speaker_index()
+    matches = [None] * len(speakers)
+    if index is not None and speakers:
+        try:
+            with span("speaker_index"):
+                matches = index.identify([embeddings.get(speaker) for speaker in speakers],
+                                         exclude={match.speaker_id for match in speaker_ids.values()})
+        except OSError as e:
+            print(f"Speaker index lookup failed: {e}")
+    for speaker, match in zip(speakers, matches):
+        if match is None:
+            speaker_mapping[speaker] = f"Caller {len(speaker_mapping) + 1}"
+        else:
+            speaker_mapping[speaker] = f"Speaker {match.speaker_id}"
+            speaker_ids[speaker] = match
+
+def decode_audio(file_path):
+    # Memory-mapped 16 kHz mono samples; chunks below are views into the same array
+    with span("decode", bytes=os.path.getsize(file_path)) as decoded:
+        audio = load_audio_array(file_path)
+        decoded.audio_seconds = audio.duration
+    return audio
+
+def trim_silence(audio, options):
+    # Holds, ringing and silence are cut before diarization; times are mapped back when formatting
+    with span("vad", audio_seconds=audio.duration):
+        speech = detect_speech(audio, **options)
+    if speech.seconds_trimmed:
+        count("vad_trimmed_seconds", speech.seconds_trimmed)
+        print(f"VAD removed {speech.seconds_trimmed:.1f}s of non-speech from {audio.duration:.1f}s of audio")
+    return speech
+
+def drop_silent_chunks(audio_chunks, speech, min_speech_ratio):
+    # Chunks that are mostly silence make Whisper hallucinate text, so they are not sent
+    for chunk, batch in audio_chunks:
+        if speech.speech_ratio(batch.start, batch.end) < min_speech_ratio:
+            count("vad_dropped_seconds", batch.end - batch.start)
+            continue
+        yield chunk, batch
+
+def split_audio_by_speaker(audio, diarization):
+    # Merge/pack diarization turns first so each Whisper request carries a useful amount of speech
+    batches = plan_batches(turns_from_diarization(diarization), **packing_options_from_env())
+    return [(audio.clip(batch.start, batch.end), batch) for batch in batches]
+
+def transcribe_chunk(chunk, word_timestamps=False, asr_backend=None):
+    # ASR_BACKEND (or the request's asr_backend) picks hosted whisper-1, Google Speech or a local model
+    return get_asr_backend(asr_backend).transcribe(chunk, word_timestamps)
+
+def identify_languages(turns, speaker_mapping):
+    # turns is [(speaker, text)]. All turns go through fastText in one call;
+    # returns (language code per turn, call-level top-k, the "languages" block)
+    identifier = get_language_identifier()
+    texts = [text for _, text in turns]
+    with span("language_detect", bytes=sum(len(text.encode('utf-8')) for text in texts)):
+        predictions = identifier.predict(texts)
+    weights = [len(text.split()) for text in texts]
+
+    per_speaker = OrderedDict()
+    for (speaker, _), turn_predictions, weight in zip(turns, predictions, weights):
+        speaker_predictions, speaker_weights = per_speaker.setdefault(speaker, ([], []))
+        speaker_predictions.append(turn_predictions)
+        speaker_weights.append(weight)
+    speaker_languages = {speaker: combine(p, w, identifier.k) for speaker, (p, w) in per_speaker.items()}
+
+    # Short turns ("ok", "si") are unreliable on their own; they take their speaker's language
+    min_confidence = float(os.getenv("LANGUAGE_ID_MIN_CONFIDENCE", "0.5"))
+    codes = []
+    for (speaker, _), turn_predictions in zip(turns, predictions):
+        if turn_predictions and turn_predictions[0].confidence >= min_confidence:
+            codes.append(turn_predictions[0].code)
+        elif speaker_languages.get(speaker):
+            codes.append(speaker_languages[speaker][0].code)
+        else:
+            codes.append(None)
+
+    call_languages = combine(predictions, weights, identifier.k)
+    languages = OrderedDict([
+        ("call", prediction_dicts(call_languages)),
+        ("speakers", OrderedDict(
+            (speaker_mapping.get(speaker, speaker), prediction_dicts(speaker_languages[speaker]))
+            for speaker in per_speaker
+        )),
+        ("turns", [
+            {"speaker": speaker_mapping.get(speaker, speaker), "language": code,
+             "languages": prediction_dicts(turn_predictions)}
+            for (speaker, _), code, turn_predictions in zip(turns, codes, predictions)
+        ]),
+    ])
+    return codes, call_languages, languages
+
+def translate_lines(lines, codes):
+    # Only non-English turns are translated. Each run of consecutive ones is
+    # sent as one text so the backend keeps their context; English lines are
+    # kept verbatim. Returns "" when there is nothing to translate.
+    runs = []
+    index = 0
+    while index < len(lines):
+        if codes[index] in (None, "en"):
+            index += 1
+            continue
+        end = index
+        while end < len(lines) and codes[end] not in (None, "en"):
+            end += 1
+        sources = set(codes[index:end])
+        runs.append((index, end, sources.pop() if len(sources) == 1 else "auto"))
+        index = end
+    if not runs:
         return ""
 
-def detect_language_with_fasttext(text):
-    cleaned_text = text.replace('\n', ' ').strip()
-    if cleaned_text:
-        predictions = fasttext_model.predict(cleaned_text)
-        detected_language_code = predictions[0][0].replace('__label__', '')
-        detected_language_name = language_mapping.get(detected_language_code, 'Unknown Language')
-        return f"{detected_language_name} ({detected_language_code})"
-    else:
-        return "Unknown Language (empty text)"
-
-def translate_text(text):
-    translation_response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant who translates text."},
-            {"role": "user", "content": f"Translate the following text to English:\n\n{text}"}
-        ],
-        max_tokens=1000,
-        temperature=0.1
-    )
-    return translation_response['choices'][0]['message']['content'].strip()
-
-def process_and_print_chunk(chunk_speaker_time, speaker_mapping):
-    chunk, speaker, start_time = chunk_speaker_time
-    transcription = transcribe_chunk(chunk)
+    texts = ["\n".join(lines[start:end]) for start, end, _ in runs]
+    service = get_translation_service(os.getenv("TRANSCRIPT_TRANSLATION_BACKEND", "openai"))
+    with span("translate", bytes=sum(len(text.encode('utf-8')) for text in texts)):
+        translations = service.translate_batch(texts, source=[source for _, _, source in runs], target="en")
+    count("translated_turns", sum(end - start for start, end, _ in runs))
+    pieces = []
+    position = 0
+    for (start, end, _), translated in zip(runs, translations):
+        pieces.extend(lines[position:start])
+        pieces.append(translated)
+        position = end
+    pieces.extend(lines[position:])
+    return "\n".join(pieces)
+
+def format_transcription_line(speaker, start_time, transcription, speaker_mapping):
     caller_label = speaker_mapping.get(speaker, f"Unknown Speaker ({speaker})")
     timestamp = f"{int(start_time // 60):02}:{int(start_time % 60):02}"
     return f"{timestamp} {caller_label}: {transcription}"
 
+def unique_audio_path(file_name):
+    # Concurrent requests for same-named recordings must not overwrite each other's audio
+    return f"tmp/{file_name}_{uuid.uuid4().hex[:12]}.wav"
+
 def download_audio_from_url(url, file_name):
-    response = requests.get(url)
-    response.raise_for_status()
-    file_path = f'tmp/{file_name}.wav'
-    with open(file_path, 'wb') as f:
-        f.write(response.content)
-    return file_path
+    # Streamed to disk with a size cap and normalised to 16 kHz mono PCM WAV
+    with span("download") as downloaded:
+        ingested = ingest_url(url, unique_audio_path(file_name))
+        downloaded.bytes = ingested.size_bytes
+    return ingested
+
+def pipeline_config(asr_backend=None):
+    # Everything that changes the /transcribe output for the same audio belongs in the cache key
+    return {
+        "diarization_model": DIARIZATION_MODEL,
+        "asr": get_asr_backend(asr_backend).config(),
+        "translation_backend": os.getenv("TRANSCRIPT_TRANSLATION_BACKEND", "openai"),
+        "target_language": "en",
+        "turn_packing": packing_options_from_env(),
+        "streaming_diarization": os.getenv("STREAMING_DIARIZATION", "auto"),
+        "streaming_windows": streaming_options_from_env(),
+        "vad": vad_options_from_env(),
+        "language_id": dict(get_language_identifier().config(),
+                            min_confidence=float(os.getenv("LANGUAGE_ID_MIN_CONFIDENCE", "0.5"))),
+        "speaker_index": speaker_index_config(),
+    }
 
 def detect_language(text):
-    try:
-        lang = detect(text)
-        return lang if lang in LANGUAGE_MAP else "en"
-    except:
-        return "en"
+    # fastText; text with nothing to go on is treated as English, as before
+    return get_language_identifier().detect(text) or "en"
+
+def translation_service_for_request(data):
+    return get_translation_service(data.get('backend') or os.getenv("TRANSLATION_BACKEND", "google"))
 
 @app.route('/translate', methods=['POST'])
 def translate():
@@ -132,9 +251,11 @@ def translate():
         return jsonify({'error': 'Message is required'}), 400
 
     source_lang = detect_language(message)
-    source_lang_name = LANGUAGE_MAP.get(source_lang, "Unknown")
+    source_lang_name = language_name(source_lang)
     try:
-        translated = GoogleTranslator(source=source_lang, target=target_language).translate(message)
+        translated = translation_service_for_request(data).translate(message, source=source_lang, target=target_language)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -146,14 +267,297 @@ def translate():
         "target_language": target_language
     })
 
+@app.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    data = request.get_json()
+    messages = data.get('messages')
+    target_language = 'en'
+    if not messages or not isinstance(messages, list) or not all(isinstance(m, str) and m for m in messages):
+        return jsonify({'error': 'messages must be a non-empty list of strings'}), 400
+
+    # One fastText call for the whole batch
+    source_langs = [
+        predictions[0].code if predictions else "en"
+        for predictions in get_language_identifier().predict(messages)
+    ]
+    try:
+        translations = translation_service_for_request(data).translate_batch(
+            messages, source=source_langs, target=target_language
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "target_language": target_language,
+        "results": [
+            {
+                "original_text": message,
+                "detected_language": source_lang,
+                "detected_language_name": language_name(source_lang),
+                "translated_text": translated,
+            }
+            for message, source_lang, translated in zip(messages, source_langs, translations)
+        ]
+    })
+
+@app.route('/translation/metrics', methods=['GET'])
+def translation_metrics():
+    return jsonify(translation_stats())
+
 @app.route('/spellcheck', methods=['POST'])
 def check_spelling():
     data = request.get_json()
     text = data.get('text', '')
-    doc = nlp(text)
-    misspelled_words = [{'word': token.text} for token in doc if not token.is_punct and token.text.lower() not in spell]
+    misspelled_words = registry.get("spellcheck").check(text, with_candidates=bool(data.get('candidates')))
     return jsonify({'misspelled': misspelled_words})
 
+@app.route('/spellcheck/batch', methods=['POST'])
+def check_spelling_batch():
+    data = request.get_json()
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': 'texts must be a list of strings'}), 400
+
+    limits = {'n_process': (1, max_spellcheck_processes()), 'batch_size': (64, max_spellcheck_batch_size())}
+    options = {}
+    for name, (default, limit) in limits.items():
+        value = str(data.get(name, default))
+        if not value.isdecimal() or int(value) < 1:
+            return jsonify({'error': f'{name} must be a positive integer'}), 400
+        options[name] = min(int(value), limit)
+    results = registry.get("spellcheck").check_batch(
+        texts,
+        with_candidates=bool(data.get('candidates')),
+        **options,
+    )
+    return jsonify({'results': [{'misspelled': misspelled} for misspelled in results]})
+
+@app.route('/resources', methods=['GET'])
+def resource_report():
+    return jsonify(registry.report())
+
+@app.route('/diarization/metrics', methods=['GET'])
+def diarization_metrics():
+    pool = get_diarization_pool(auth_token=os.getenv("USER_AUTH_TOKEN"))
+    return jsonify(pool.metrics())
+
+@app.route('/transcription/metrics', methods=['GET'])
+def transcription_metrics():
+    return jsonify(get_chunk_scheduler().stats())
+
+@app.route('/cache/metrics', methods=['GET'])
+def cache_metrics():
+    return jsonify(get_result_cache().stats())
+
+@app.route('/language/metrics', methods=['GET'])
+def language_metrics():
+    return jsonify(get_language_identifier().stats())
+
+@app.route('/speakers/metrics', methods=['GET'])
+def speaker_index_metrics():
+    return jsonify(speaker_index_stats())
+
+metrics.register_collector("process", lambda: {"resident_memory_bytes": current_rss_bytes()})
+metrics.register_collector("transcription_scheduler", lambda: get_chunk_scheduler().stats())
+metrics.register_collector("result_cache", lambda: get_result_cache().stats())
+metrics.register_collector("language_id", lambda: get_language_identifier().stats())
+metrics.register_collector("speaker_index", speaker_index_stats)
+metrics.register_collector(
+    "diarization_pool", lambda: get_diarization_pool(auth_token=os.getenv("USER_AUTH_TOKEN")).metrics()
+)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+class DiarizationFailed(Exception):
+    pass
+
+def iter_streaming_chunks(audio, speaker_mapping, speaker_ids):
+    # Windows are diarized one after another while the scheduler is already
+    # transcribing the turns finished in earlier windows
+    pool = get_diarization_pool(auth_token=os.getenv("USER_AUTH_TOKEN"))
+    diarizer = StreamingDiarizer(pool, **streaming_options_from_env())
+    packing_options = packing_options_from_env()
+    for window_turns in diarizer.iter_turns(audio):
+        # Speakers are labelled when they first appear, from that window's embedding
+        new_speakers = list(dict.fromkeys(turn.speaker for turn in window_turns if turn.speaker not in speaker_mapping))
+        label_speakers(new_speakers, diarizer.speaker_embeddings, speaker_mapping, speaker_ids)
+        for batch in plan_batches(window_turns, **packing_options):
+            yield (audio.clip(batch.start, batch.end), batch)
+
+def run_transcription_pipeline(file_path, progress=NO_PROGRESS, asr_backend=None):
+    backend = get_asr_backend(asr_backend)
+    vad_options = vad_options_from_env()
+    speech = trim_silence(decode_audio(file_path), vad_options)
+    audio = speech.audio
+    progress.stage("diarizing")
+    speaker_mapping = {}
+    speaker_ids = OrderedDict()
+    if not audio.duration:
+        audio_chunks = []
+        chunks_total = 0
+    elif use_streaming_diarization(audio.duration):
+        audio_chunks = drop_silent_chunks(iter_streaming_chunks(audio, speaker_mapping, speaker_ids), speech,
+                                          vad_options["min_speech_ratio"])
+        chunks_total = None
+    else:
+        diarization, embeddings = diarize_audio(audio)
+        if not diarization:
+            raise DiarizationFailed("Diarization failed.")
+
+        audio_chunks = list(drop_silent_chunks(split_audio_by_speaker(audio, diarization), speech,
+                                               vad_options["min_speech_ratio"]))
+        label_speakers(sorted(diarization.labels()), embeddings, speaker_mapping, speaker_ids)
+        chunks_total = len(audio_chunks)
+        progress.stage("diarized", chunks_total=chunks_total)
+
+    return transcribe_audio_chunks(backend, speech, audio_chunks, speaker_mapping, chunks_total, progress,
+                                   speaker_ids)
+
+def run_batch_pipeline(file_path, progress=NO_PROGRESS, asr_backend=None):
+    # Diarization runs in the batch process pool while this thread loads and trims the
+    # same file for slicing; the chunks then join the shared transcription scheduler
+    backend = get_asr_backend(asr_backend)
+    vad_options = vad_options_from_env()
+    diarized = submit_diarization(file_path, vad_options, streaming_options_from_env())
+    speech = trim_silence(decode_audio(file_path), vad_options)
+    progress.stage("diarizing")
+    with span("diarize", audio_seconds=speech.audio.duration):
+        turns, speakers, embeddings = diarized.result()
+    batches = plan_batches([Turn(*turn) for turn in turns], **packing_options_from_env())
+    audio_chunks = list(drop_silent_chunks(((speech.audio.clip(batch.start, batch.end), batch) for batch in batches),
+                                           speech, vad_options["min_speech_ratio"]))
+    speaker_mapping = {}
+    speaker_ids = OrderedDict()
+    label_speakers(speakers, embeddings, speaker_mapping, speaker_ids)
+    progress.stage("diarized", chunks_total=len(audio_chunks))
+    return transcribe_audio_chunks(backend, speech, audio_chunks, speaker_mapping, len(audio_chunks), progress,
+                                   speaker_ids)
+
+def transcribe_audio_chunks(backend, speech, audio_chunks, speaker_mapping, chunks_total, progress=NO_PROGRESS,
+                            speaker_ids=None):
+    all_transcriptions = []
+    turn_texts = []
+    chunks_done = 0
+    chunks_failed = 0
+
+    # Called in start-time order as groups finish, so job streams see lines as soon as they're ready
+    def on_group_transcribed(result):
+        nonlocal chunks_done, chunks_failed
+        # A group that failed after its retries yields empty text for each of its chunks
+        responses = result.text if result.error is None else [""] * len(result.item)
+        if result.error is not None:
+            chunks_failed += len(result.item)
+        for (_, batch), response in zip(result.item, responses):
+            for turn, text in split_batch_transcript(batch, response):
+                formatted_output = format_transcription_line(
+                    turn.speaker, speech.original_time(turn.start), text, speaker_mapping
+                )
+                all_transcriptions.append(formatted_output)
+                turn_texts.append((turn.speaker, text))
+                progress.line(formatted_output)
+            chunks_done += 1
+        progress.chunks(chunks_done, chunks_total)
+
+    # Groups run on scheduler threads; hand them this request's trace so their spans land in it
+    trace = current_trace()
+
+    def transcribe_group(group):
+        with activate(trace):
+            return backend.transcribe_batch(
+                [chunk for chunk, _ in group],
+                word_timestamps=any(needs_word_timestamps(batch) for _, batch in group),
+            )
+
+    async def transcribe_group_async(group):
+        # Coroutines share the event-loop thread, so the trace is passed rather than activated
+        return await backend.transcribe_batch_async(
+            [chunk for chunk, _ in group],
+            word_timestamps=any(needs_word_timestamps(batch) for _, batch in group),
+            trace=trace,
+        )
+
+    if chunks_total is not None:
+        audio_chunks = sorted(audio_chunks, key=lambda item: item[1].start)
+    # Local backends decode several chunks per inference call; the hosted API takes one per request
+    progress.stage("transcribing")
+    backend.scheduler().map(
+        transcribe_group_async if backend.asynchronous else transcribe_group,
+        iter_groups(audio_chunks, backend.max_batch_size),
+        start_time=lambda group: group[0][1].start,
+        on_result=on_group_transcribed,
+        presorted=True,
+    )
+    progress.chunks(chunks_done, chunks_done)
+
+    codes, call_languages, languages = identify_languages(turn_texts, speaker_mapping)
+    translated_text = ""
+    if any(code not in (None, "en") for code in codes):
+        progress.stage("translating")
+        translated_text = translate_lines(all_transcriptions, codes)
+
+    response_data = OrderedDict([
+        ("converted_transcription", "\n".join(all_transcriptions)),
+        ("original_language", language_label(call_languages[0].code if call_languages else None)),
+        ("original_transcription", "\n".join(all_transcriptions)),
+        ("converted_language", "English (en)"),
+        ("transcription", translated_text if translated_text else "\n".join(all_transcriptions)),
+        ("languages", languages),
+        # Some chunks failed after all retries and are missing from the transcript
+        ("partial", chunks_failed > 0),
+    ])
+    if chunks_failed:
+        count("failed_chunks", chunks_failed)
+        response_data["failed_chunks"] = chunks_failed
+    if get_speaker_index() is not None:
+        # Which labels are stable cross-call ids, and how sure each match was
+        response_data["speakers"] = OrderedDict(
+            (speaker_mapping[speaker], match._asdict()) for speaker, match in (speaker_ids or {}).items()
+        )
+    return response_data
+
+def transcribe_with_cache(file_path, content_hash, progress=NO_PROGRESS, asr_backend=None,
+                          pipeline=run_transcription_pipeline):
+    # Keyed on the audio bytes and pipeline settings, so same-named recordings never collide
+    result_cache = get_result_cache()
+    result_key = cache_key(content_hash, pipeline_config(asr_backend))
+    with span("cache_lookup"):
+        saved_response = result_cache.get(result_key)
+    if saved_response is not None:
+        trace = current_trace()
+        if trace is not None:
+            trace.cache_hit = True
+        progress.stage("cached")
+        return saved_response
+    response_data = pipeline(file_path, progress, asr_backend)
+    # A transcript missing failed chunks is returned but not kept, so the next upload retries it
+    if not response_data.get("partial"):
+        result_cache.set(result_key, response_data)
+    return response_data
+
+def ingest_request_audio():
+    # Returns (ingested, file_name) for an upload; URLs are handled by the caller
+    return ingest_file_storage(request.files['file'])
+
+def ingest_file_storage(file):
+    file_name = re.sub(r'\W+', '_', file.filename.rsplit('.', 1)[0])
+    with span("upload") as uploaded:
+        ingested = ingest_upload(file, unique_audio_path(file_name))
+        uploaded.bytes = ingested.size_bytes
+    return ingested, file_name
+
+def wants_timings():
+    value = request.form.get('timings') or request.args.get('timings') or ""
+    return value.lower() in ("1", "true", "yes")
+
+def with_timings(response_data, trace):
+    response_data = OrderedDict(response_data)
+    response_data["timings"] = trace.breakdown()
+    return response_data
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
     authToken = request.headers.get('Authorization')
@@ -165,59 +569,327 @@ def transcribe():
     if not file and not url:
         return jsonify({"error": "No file or URL provided"}), 400
 
-    if file:
-        file_name = re.sub(r'\W+', '_', file.filename.rsplit('.', 1)[0])
-        file_path = f"tmp/{file_name}.wav"
-        file.save(file_path)
-    elif url:
-        file_name = extract_filename_from_url(url)
-        file_path = download_audio_from_url(url, file_name)
-
-    json_file_path = f"tmp/{file_name}.json"
-    if os.path.exists(json_file_path):
-        with open(json_file_path, 'r') as file:
-            saved_response = json.load(file, object_pairs_hook=OrderedDict)
-        return Response(json.dumps(saved_response, indent=4), mimetype='application/json')
-
+    asr_backend = request.form.get('asr_backend')
     try:
-        diarization = diarize_audio(file_path)
-        if not diarization:
-            return jsonify({"error": "Diarization failed."}), 500
-
-        audio_chunks = split_audio_by_speaker(file_path, diarization)
-        speakers = sorted(set(speaker for _, speaker, _ in audio_chunks))
-        speaker_mapping = {speaker: f"Caller {i+1}" for i, speaker in enumerate(speakers)}
-
-        full_transcription = ""
-        all_transcriptions = []
-        for chunk_speaker_time in audio_chunks:
-            formatted_output = process_and_print_chunk(chunk_speaker_time, speaker_mapping)
-            full_transcription += f"{formatted_output} "
-            all_transcriptions.append(formatted_output)
-
-        detected_language = detect_language_with_fasttext(full_transcription)
-        translated_text = ""
-        if 'en' not in detected_language:
-            translated_text = translate_text(full_transcription)
-
-        response_data = OrderedDict([
-            ("converted_transcription", "\n".join(all_transcriptions)),
-            ("original_language", detected_language),
-            ("original_transcription", "\n".join(all_transcriptions)),
-            ("converted_language", "English (en)"),
-            ("transcription", translated_text if translated_text else "\n".join(all_transcriptions))
-        ])
-
-        with open(json_file_path, 'w') as json_file:
-            json.dump(response_data, json_file, indent=4)
+        get_asr_backend(asr_backend)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    trace = Trace("transcribe")
+    with activate(trace):
+        return traced_transcribe(file, url, asr_backend, trace)
 
+def traced_transcribe(file, url, asr_backend, trace):
+    try:
+        if file:
+            ingested, _ = ingest_request_audio()
+        elif url:
+            ingested = download_audio_from_url(url, extract_filename_from_url(url))
+    except AudioTooLarge as e:
+        trace.finish("rejected")
+        return jsonify({"error": str(e)}), 413
+    except IngestError as e:
+        trace.finish("rejected")
+        return jsonify({"error": str(e)}), 400
+    except requests.RequestException as e:
+        trace.finish("download_failed")
+        return jsonify({"error": "Failed to download audio from URL", "details": str(e)}), 502
+    file_path = ingested.path
+    trace.audio_seconds = audio_duration(file_path)
+
+    outcome = "error"
+    try:
+        response_data = transcribe_with_cache(file_path, ingested.sha256, asr_backend=asr_backend)
+        outcome = "ok"
+        trace.finish(outcome)
+        if wants_timings():
+            response_data = with_timings(response_data, trace)
         return Response(json.dumps(response_data, indent=4), mimetype='application/json')
+    except DiarizationFailed:
+        outcome = "diarization_failed"
+        return jsonify({"error": "Diarization failed."}), 500
     # except Exception as e:
     #     return jsonify({"error": "An error occurred during transcription"}), 500
     except Exception as e:
         print("Exception occurred:", str(e))  # Console me error print hoga
         return jsonify({"error": "An error occurred during transcription", "details": str(e)}), 500
-    
+    finally:
+        trace.finish(outcome)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def run_batch_item(index, item, deduplicator, asr_backend, include_timings):
+    entry = OrderedDict([("index", index), ("source", item["name"])])
+    trace = Trace("batch")
+    outcome = "error"
+    with activate(trace):
+        try:
+            ingested = item.get("ingested") or download_audio_from_url(item["url"], extract_filename_from_url(item["url"]))
+            entry["sha256"] = ingested.sha256
+            try:
+                trace.audio_seconds = audio_duration(ingested.path)
+                shared, owner = deduplicator.claim(ingested.sha256)
+                if owner:
+                    try:
+                        shared.set_result(transcribe_with_cache(ingested.path, ingested.sha256, asr_backend=asr_backend,
+                                                                pipeline=run_batch_pipeline))
+                    except Exception as e:
+                        shared.set_exception(e)
+                else:
+                    # Same audio as another file in this batch; its result is reused
+                    entry["duplicate"] = True
+                    trace.cache_hit = True
+            finally:
+                if os.path.exists(ingested.path):
+                    os.remove(ingested.path)
+            entry["status"] = "completed"
+            entry["result"] = shared.result()
+            outcome = "ok"
+        except Exception as e:
+            print(f"Batch item {index} ({item['name']}) failed: {e}")
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+        finally:
+            trace.finish(outcome)
+    if include_timings:
+        entry["timings"] = trace.breakdown()
+    return entry
+
+def failed_batch_item(index, name, error):
+    future = Future()
+    future.set_result(OrderedDict([("index", index), ("source", name), ("status", "failed"), ("error", error)]))
+    return future
+
+def stream_batch_results(futures):
+    # One JSON line per file in completion order, then a summary line
+    hashes = set()
+    failed = 0
+    for future in as_completed(futures):
+        entry = future.result()
+        if entry["status"] == "failed":
+            failed += 1
+        elif "sha256" in entry:
+            hashes.add(entry["sha256"])
+        yield json.dumps(entry) + "\n"
+    yield json.dumps({"done": True, "files": len(futures), "unique_recordings": len(hashes), "failed": failed}) + "\n"
+
+@app.route('/transcribe/batch', methods=['POST'])
+def transcribe_batch():
+    authToken = request.headers.get('Authorization')
+    if authToken != os.getenv("API_TOKEN"):
+        return jsonify({"error": "Invalid Request"}), 403
+
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    urls = request.form.getlist('urls') + request.form.getlist('url')
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is not None and not isinstance(data, dict):
+        return jsonify({"error": "JSON body must be an object"}), 400
+    data = data or {}
+    json_urls = data.get('urls') or []
+    if not isinstance(json_urls, list) or not all(isinstance(url, str) and url for url in json_urls):
+        return jsonify({"error": "urls must be a list of non-empty strings"}), 400
+    urls += json_urls
+    if not uploads and not urls:
+        return jsonify({"error": "No files or URLs provided"}), 400
+    max_files = int(os.getenv("BATCH_MAX_FILES", "200"))
+    if len(uploads) + len(urls) > max_files:
+        return jsonify({"error": f"At most {max_files} recordings per batch"}), 400
+    asr_backend = request.form.get('asr_backend') or data.get('asr_backend')
+    try:
+        get_asr_backend(asr_backend)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    executor = get_batch_executor()
+    deduplicator = ContentDeduplicator()
+    include_timings = wants_timings()
+    futures = []
+    # Uploads are copied out of the request before it returns; URLs download on the batch threads
+    for upload in uploads:
+        index = len(futures)
+        try:
+            ingested, _ = ingest_file_storage(upload)
+        except (AudioTooLarge, IngestError) as e:
+            futures.append(failed_batch_item(index, upload.filename, str(e)))
+            continue
+        item = {"name": upload.filename, "ingested": ingested}
+        futures.append(executor.submit(run_batch_item, index, item, deduplicator, asr_backend, include_timings))
+    for url in urls:
+        item = {"name": url, "url": url}
+        futures.append(executor.submit(run_batch_item, len(futures), item, deduplicator, asr_backend, include_timings))
+
+    return Response(stream_batch_results(futures), mimetype='application/x-ndjson',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def read_saved_audio(path):
+    with open(path, 'rb') as audio_file:
+        yield from read_stream(audio_file)
+
+def stream_google_events(recognizer, chunks, close=None):
+    trace = Trace("google_stream")
+    outcome = "error"
+    try:
+        with span("google_stream", trace=trace) as streamed:
+            for event in recognizer.events(chunks):
+                streamed.audio_seconds = recognizer.audio_seconds
+                yield json.dumps(event) + "\n"
+        outcome = "ok"
+    except AudioTooLarge as e:
+        outcome = "rejected"
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+    except Exception as e:
+        print(f"Google streaming recognition failed: {e}")
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+    finally:
+        if close is not None:
+            close()
+        trace.audio_seconds = recognizer.audio_seconds
+        trace.finish(outcome)
+
+@app.route('/transcribe/google/stream', methods=['POST'])
+def transcribe_google_stream():
+    authToken = request.headers.get('Authorization')
+    if authToken != os.getenv("API_TOKEN"):
+        return jsonify({"error": "Invalid Request"}), 403
+
+    file = request.files.get('file')
+    url = request.form.get('url')
+    if not file and not url:
+        return jsonify({"error": "No file or URL provided"}), 400
+    if not file and not url.startswith("http"):
+        return jsonify({"error": "Invalid URL"}), 400
+
+    speakers = request.form.get('speakers') or os.getenv("GOOGLE_SPEECH_MAX_SPEAKERS", "6")
+    if not speakers.isdecimal() or int(speakers) < 1:
+        return jsonify({"error": "speakers must be a positive integer"}), 400
+
+    recognizer = GoogleStreamingRecognizer(
+        language_code=request.form.get('language') or os.getenv("GOOGLE_SPEECH_LANGUAGE", "en-US"),
+        speaker_count=int(speakers),
+        interim_results=request.form.get('interim', '1').lower() not in ("0", "false", "no"),
+    )
+    if file:
+        # The upload is closed once the view returns, so it is kept (size-capped, as received) until streamed
+        try:
+            ingested = ingest_upload(file, unique_audio_path("google_stream"), transcode=False)
+        except AudioTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        events = stream_google_events(recognizer, read_saved_audio(ingested.path), lambda: os.remove(ingested.path))
+        return Response(events, mimetype='application/x-ndjson', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    try:
+        # Audio is forwarded to Google as it downloads instead of after
+        download = open_url_stream(url)
+    except AudioTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except requests.RequestException as e:
+        return jsonify({"error": "Failed to download audio from URL", "details": str(e)}), 502
+    chunks = download.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+    return Response(stream_google_events(recognizer, chunks, download.close), mimetype='application/x-ndjson',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def run_transcription_job(source, progress):
+    trace = Trace("job")
+    outcome = "error"
+    with activate(trace):
+        try:
+            result = run_traced_job(source, progress, trace)
+            outcome = "ok"
+        finally:
+            trace.finish(outcome)
+    return with_timings(result, trace) if source.get("timings") else result
+
+def run_traced_job(source, progress, trace):
+    if source["type"] == "url":
+        progress.stage("downloading")
+        ingested = download_audio_from_url(source["url"], source["file_name"])
+        file_path, content_hash = ingested.path, ingested.sha256
+    else:
+        file_path, content_hash = source["path"], source["sha256"]
+    try:
+        trace.audio_seconds = audio_duration(file_path)
+        return transcribe_with_cache(file_path, content_hash, progress, source.get("asr_backend"))
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def can_resume_job(source):
+    return source["type"] == "url" or os.path.exists(source["path"])
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            store = JobStore(os.getenv("JOB_STORE_PATH", "tmp/jobs.sqlite3"))
+            _job_manager = JobManager(store, run_transcription_job, max_workers=int(os.getenv("JOB_WORKERS", "2")),
+                                      can_resume=can_resume_job)
+            resumed = _job_manager.recover(can_resume_job)
+            if resumed:
+                print(f"Resumed {resumed} unfinished transcription job(s)")
+        return _job_manager
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    authToken = request.headers.get('Authorization')
+    if authToken != os.getenv("API_TOKEN"):
+        return jsonify({"error": "Invalid Request"}), 403
+
+    file = request.files.get('file')
+    url = request.form.get('url')
+    if not file and not url:
+        return jsonify({"error": "No file or URL provided"}), 400
+    asr_backend = request.form.get('asr_backend')
+    try:
+        get_asr_backend(asr_backend)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if file:
+        try:
+            ingested, file_name = ingest_request_audio()
+        except AudioTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        except IngestError as e:
+            return jsonify({"error": str(e)}), 400
+        source = {"type": "upload", "path": ingested.path, "sha256": ingested.sha256, "file_name": file_name}
+    else:
+        # Downloading happens on the job worker so the request returns immediately
+        source = {"type": "url", "url": url, "file_name": extract_filename_from_url(url)}
+    source["timings"] = wants_timings()
+    source["asr_backend"] = asr_backend
+
+    job_id = get_job_manager().submit(source)
+    return jsonify({
+        "id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "stream_url": f"/jobs/{job_id}/stream",
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    authToken = request.headers.get('Authorization')
+    if authToken != os.getenv("API_TOKEN"):
+        return jsonify({"error": "Invalid Request"}), 403
+
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return Response(json.dumps(job_status(job), indent=4), mimetype='application/json')
+
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    authToken = request.headers.get('Authorization')
+    if authToken != os.getenv("API_TOKEN"):
+        return jsonify({"error": "Invalid Request"}), 403
+
+    manager = get_job_manager()
+    if manager.store.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    return Response(manager.stream(job_id), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8962, debug=False)
@@ -0,0 +1,378 @@
+import os
+import threading
+
+import numpy as np
+import openai
+
+from audio_buffers import chunk_format_from_env, export_chunk_to_buffer
+from chunk_scheduler import AsyncChunkScheduler, ChunkScheduler, async_transcription_enabled, get_chunk_scheduler
+from google_speech import (
+    SYNC_RECOGNIZE_SECONDS,
+    create_async_speech_client,
+    get_speech_client,
+    recognition_config,
+    response_segments,
+    speech_module,
+)
+from tracing import span
+
+ASR_SAMPLE_RATE = 16000
+# Whisper models decode 30-second windows; longer clips can't be a single batch item
+MAX_CLIP_SECONDS = 30.0
+
+
+def chunk_samples(chunk):
+    # float32 mono at 16 kHz, which is what the local models take
+    if chunk.frame_rate != ASR_SAMPLE_RATE or chunk.channels != 1:
+        chunk = chunk.set_frame_rate(ASR_SAMPLE_RATE).set_channels(1)
+    samples = np.array(chunk.get_array_of_samples(), dtype=np.float32)
+    return samples / float(1 << (8 * chunk.sample_width - 1))
+
+
+def iter_groups(items, size):
+    # Consecutive runs of up to `size` items; works on generators without reading ahead
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def concatenate_clips(audios, gap_seconds=0.0):
+    # Lays clips end to end (optionally with silence between them) and returns
+    # the joined audio plus each clip's start offset in seconds
+    gap = np.zeros(int(gap_seconds * ASR_SAMPLE_RATE), dtype=np.float32)
+    pieces = []
+    offsets = []
+    position = 0
+    for audio in audios:
+        if pieces and len(gap):
+            pieces.append(gap)
+            position += len(gap)
+        offsets.append(position / ASR_SAMPLE_RATE)
+        pieces.append(audio)
+        position += len(audio)
+    return np.concatenate(pieces), offsets
+
+
+def clip_index(offsets, timestamp):
+    index = int(np.searchsorted(offsets, timestamp, side="right")) - 1
+    return min(len(offsets) - 1, max(0, index))
+
+
+def timed_response(segments, word_timestamps):
+    # Same shape as Whisper's verbose_json, so split_batch_transcript can use it.
+    # `segments` are (start, end, text, words) with times relative to the clip.
+    response = {
+        "text": " ".join(text.strip() for _, _, text, _ in segments).strip(),
+        "segments": [{"start": start, "end": end, "text": text.strip()} for start, end, text, _ in segments],
+    }
+    if word_timestamps:
+        response["words"] = [word for _, _, _, words in segments for word in words]
+    return response
+
+
+class OpenAIWhisperBackend:
+    name = "openai"
+    max_batch_size = 1
+
+    def __init__(self, model="whisper-1", audio_format="wav"):
+        self.model = model
+        self.audio_format = audio_format
+        self._session = None
+
+    def config(self):
+        return {"backend": self.name, "model": self.model}
+
+    def scheduler(self):
+        # The shared, rate-limited scheduler sized for the hosted API
+        return get_chunk_scheduler()
+
+    @property
+    def asynchronous(self):
+        return self.scheduler().asynchronous
+
+    def _export(self, chunk, trace=None):
+        with span("chunk_export", audio_seconds=len(chunk) / 1000.0, trace=trace) as exported:
+            audio_file = export_chunk_to_buffer(chunk, self.audio_format)
+            exported.bytes = audio_file.getbuffer().nbytes
+        return audio_file
+
+    def _request_options(self, word_timestamps):
+        if word_timestamps:
+            return {"response_format": "verbose_json", "timestamp_granularities[]": "word"}
+        return {"response_format": "json"}
+
+    def transcribe(self, chunk, word_timestamps=False):
+        # Errors propagate so the chunk scheduler can retry; it falls back to "" once retries run out
+        audio_file = self._export(chunk)
+        with span("whisper", bytes=audio_file.getbuffer().nbytes, audio_seconds=len(chunk) / 1000.0):
+            response = openai.Audio.transcribe(model=self.model, file=audio_file,
+                                               **self._request_options(word_timestamps))
+        return response if word_timestamps else response.get('text', '')
+
+    async def transcribe_async(self, chunk, word_timestamps=False, trace=None):
+        import aiohttp
+
+        if self._session is None:
+            # One keep-alive session on the scheduler's loop instead of a new connection per call
+            self._session = aiohttp.ClientSession()
+        openai.aiosession.set(self._session)
+        audio_file = self._export(chunk, trace)
+        with span("whisper", bytes=audio_file.getbuffer().nbytes, audio_seconds=len(chunk) / 1000.0, trace=trace):
+            response = await openai.Audio.atranscribe(model=self.model, file=audio_file,
+                                                      **self._request_options(word_timestamps))
+        return response if word_timestamps else response.get('text', '')
+
+    def transcribe_batch(self, chunks, word_timestamps=False):
+        return [self.transcribe(chunk, word_timestamps) for chunk in chunks]
+
+    async def transcribe_batch_async(self, chunks, word_timestamps=False, trace=None):
+        return [await self.transcribe_async(chunk, word_timestamps, trace) for chunk in chunks]
+
+
+class GoogleSpeechBackend:
+    # Google Cloud Speech-to-Text on the pyannote turns, one chunk per request.
+    # Chunks over the synchronous limit go through long_running_recognize().
+    name = "google"
+    max_batch_size = 1
+
+    def __init__(self, language="en-US", workers=8, timeout=300):
+        self.language = language
+        self.workers = max(1, int(workers))
+        self.timeout = float(timeout)
+        self._async_client = None
+        self._scheduler = None
+        self._lock = threading.Lock()
+
+    def config(self):
+        return {"backend": self.name, "language": self.language}
+
+    def scheduler(self):
+        # Separate from the OpenAI scheduler: different quota, no shared rate limit
+        with self._lock:
+            if self._scheduler is None:
+                scheduler_class = AsyncChunkScheduler if async_transcription_enabled() else ChunkScheduler
+                self._scheduler = scheduler_class(max_workers=self.workers, max_retries=3, backoff_seconds=1.0)
+            return self._scheduler
+
+    @property
+    def asynchronous(self):
+        return self.scheduler().asynchronous
+
+    def _request(self, chunk, word_timestamps):
+        config = recognition_config(chunk.frame_rate, self.language, word_timestamps)
+        audio = speech_module().RecognitionAudio(content=bytes(chunk.raw_data))
+        return config, audio, len(chunk) / 1000.0 > SYNC_RECOGNIZE_SECONDS
+
+    def transcribe(self, chunk, word_timestamps=False):
+        config, audio, long_running = self._request(chunk, word_timestamps)
+        client = get_speech_client()
+        with span("google_speech", bytes=len(audio.content), audio_seconds=len(chunk) / 1000.0):
+            if long_running:
+                response = client.long_running_recognize(config=config, audio=audio).result(timeout=self.timeout)
+            else:
+                response = client.recognize(config=config, audio=audio, timeout=self.timeout)
+        return timed_response(response_segments(response, word_timestamps), word_timestamps)
+
+    async def transcribe_async(self, chunk, word_timestamps=False, trace=None):
+        if self._async_client is None:
+            self._async_client = create_async_speech_client()
+        config, audio, long_running = self._request(chunk, word_timestamps)
+        with span("google_speech", bytes=len(audio.content), audio_seconds=len(chunk) / 1000.0, trace=trace):
+            if long_running:
+                operation = await self._async_client.long_running_recognize(config=config, audio=audio)
+                response = await operation.result(timeout=self.timeout)
+            else:
+                response = await self._async_client.recognize(config=config, audio=audio, timeout=self.timeout)
+        return timed_response(response_segments(response, word_timestamps), word_timestamps)
+
+    def transcribe_batch(self, chunks, word_timestamps=False):
+        return [self.transcribe(chunk, word_timestamps) for chunk in chunks]
+
+    async def transcribe_batch_async(self, chunks, word_timestamps=False, trace=None):
+        return [await self.transcribe_async(chunk, word_timestamps, trace) for chunk in chunks]
+
+
+class LocalBackend:
+    # Shared plumbing for in-process models: lazy load, one lock per model and
+    # a small dedicated scheduler, since CPU inference gains nothing from the
+    # API's concurrency and must not be throttled by its rate limit.
+    asynchronous = False
+
+    def __init__(self, model, batch_size=8, workers=1, language=None):
+        self.model = model
+        self.max_batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+        self.language = language or None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._scheduler = None
+
+    def config(self):
+        return {"backend": self.name, "model": self.model, "language": self.language}
+
+    def scheduler(self):
+        with self._load_lock:
+            if self._scheduler is None:
+                self._scheduler = ChunkScheduler(max_workers=self.workers, max_retries=1, backoff_seconds=0.1)
+            return self._scheduler
+
+    def loaded_model(self):
+        with self._load_lock:
+            if self._model is None:
+                self._model = self._load()
+                print(f"Loaded {self.name} model {self.model}")
+            return self._model
+
+    def transcribe(self, chunk, word_timestamps=False):
+        return self.transcribe_batch([chunk], word_timestamps)[0]
+
+    def transcribe_batch(self, chunks, word_timestamps=False):
+        audios = [chunk_samples(chunk) for chunk in chunks]
+        with span(self.name.replace("-", "_"), audio_seconds=sum(len(audio) for audio in audios) / ASR_SAMPLE_RATE):
+            return self._transcribe_audios(audios, word_timestamps)
+
+
+class FasterWhisperBackend(LocalBackend):
+    name = "faster-whisper"
+
+    def __init__(self, model="base", compute_type="int8", device="cpu", cpu_threads=0, beam_size=1, **kwargs):
+        super().__init__(model, **kwargs)
+        self.compute_type = compute_type
+        self.device = device
+        self.cpu_threads = int(cpu_threads)
+        self.beam_size = int(beam_size)
+        self._batched = None
+
+    def config(self):
+        return dict(super().config(), compute_type=self.compute_type, beam_size=self.beam_size)
+
+    def _load(self):
+        from faster_whisper import WhisperModel
+
+        model = WhisperModel(self.model, device=self.device, compute_type=self.compute_type,
+                             cpu_threads=self.cpu_threads)
+        try:
+            from faster_whisper import BatchedInferencePipeline
+
+            self._batched = BatchedInferencePipeline(model=model)
+        except ImportError:
+            # faster-whisper < 1.1 has no batched pipeline; chunks are decoded one by one
+            self._batched = None
+        return model
+
+    def _transcribe_audios(self, audios, word_timestamps):
+        model = self.loaded_model()
+        if self._batched is not None and len(audios) > 1 and \
+                all(len(audio) <= MAX_CLIP_SECONDS * ASR_SAMPLE_RATE for audio in audios):
+            return self._transcribe_batched(audios, word_timestamps)
+        responses = []
+        for audio in audios:
+            segments, _ = model.transcribe(audio, beam_size=self.beam_size, language=self.language,
+                                           word_timestamps=word_timestamps, vad_filter=False)
+            responses.append(timed_response([self._segment(segment, 0.0) for segment in segments], word_timestamps))
+        return responses
+
+    def _transcribe_batched(self, audios, word_timestamps):
+        # Every chunk becomes one clip of the joined audio, so the whole group
+        # goes through the encoder and decoder as a single CTranslate2 batch
+        audio, offsets = concatenate_clips(audios)
+        clips = [{"start": offset, "end": offset + len(clip) / ASR_SAMPLE_RATE} for offset, clip in zip(offsets, audios)]
+        segments, _ = self._batched.transcribe(audio, batch_size=len(audios), clip_timestamps=clips, vad_filter=False,
+                                               beam_size=self.beam_size, language=self.language,
+                                               word_timestamps=word_timestamps)
+        grouped = [[] for _ in audios]
+        for segment in segments:
+            index = clip_index(offsets, segment.start)
+            grouped[index].append(self._segment(segment, offsets[index]))
+        return [timed_response(clip_segments, word_timestamps) for clip_segments in grouped]
+
+    def _segment(self, segment, offset):
+        words = [{"word": word.word.strip(), "start": word.start - offset, "end": word.end - offset}
+                 for word in (segment.words or [])]
+        return segment.start - offset, segment.end - offset, segment.text, words
+
+
+class WhisperCppBackend(LocalBackend):
+    # whisper.cpp decodes one buffer per call, so a group of chunks is joined
+    # with short silences into a single buffer; short chunks then share encoder
+    # windows instead of each paying for a full 30-second pass.
+    name = "whisper-cpp"
+    gap_seconds = 1.0
+
+    def __init__(self, model="base", threads=0, **kwargs):
+        super().__init__(model, **kwargs)
+        self.threads = int(threads)
+        self._inference_lock = threading.Lock()
+
+    def _load(self):
+        from pywhispercpp.model import Model
+
+        options = {"print_progress": False, "print_realtime": False}
+        if self.threads:
+            options["n_threads"] = self.threads
+        if self.language:
+            options["language"] = self.language
+        return Model(self.model, **options)
+
+    def _transcribe_audios(self, audios, word_timestamps):
+        model = self.loaded_model()
+        audio, offsets = concatenate_clips(audios, self.gap_seconds)
+        # With max_len=1 every segment is a single word, which gives word timings
+        params = {"token_timestamps": True, "max_len": 1, "split_on_word": True} if word_timestamps else {}
+        with self._inference_lock:
+            # A whisper.cpp context is not safe to share between threads
+            segments = model.transcribe(audio, **params)
+        grouped = [[] for _ in audios]
+        for segment in segments:
+            start, end = segment.t0 / 100.0, segment.t1 / 100.0
+            index = clip_index(offsets, (start + end) / 2)
+            start, end = start - offsets[index], end - offsets[index]
+            words = [{"word": segment.text.strip(), "start": start, "end": end}] if word_timestamps else []
+            grouped[index].append((start, end, segment.text, words))
+        return [timed_response(clip_segments, word_timestamps) for clip_segments in grouped]
+
+
+def _local_options():
+    return {
+        "model": os.getenv("ASR_LOCAL_MODEL", "base"),
+        "batch_size": int(os.getenv("ASR_LOCAL_BATCH_SIZE", "8")),
+        "workers": int(os.getenv("ASR_LOCAL_WORKERS", "1")),
+        "language": os.getenv("ASR_LOCAL_LANGUAGE"),
+    }
+
+
+BACKENDS = {
+    "openai": lambda: OpenAIWhisperBackend(audio_format=chunk_format_from_env()),
+    "faster-whisper": lambda: FasterWhisperBackend(
+        compute_type=os.getenv("ASR_LOCAL_COMPUTE_TYPE", "int8"),
+        device=os.getenv("ASR_LOCAL_DEVICE", "cpu"),
+        cpu_threads=os.getenv("ASR_LOCAL_THREADS", "0"),
+        beam_size=os.getenv("ASR_LOCAL_BEAM_SIZE", "1"),
+        **_local_options()
+    ),
+    "whisper-cpp": lambda: WhisperCppBackend(threads=os.getenv("ASR_LOCAL_THREADS", "0"), **_local_options()),
+    "google": lambda: GoogleSpeechBackend(
+        language=os.getenv("GOOGLE_SPEECH_LANGUAGE", "en-US"),
+        workers=os.getenv("GOOGLE_SPEECH_CONCURRENCY", "8"),
+        timeout=os.getenv("GOOGLE_SPEECH_TIMEOUT", "300"),
+    ),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_asr_backend(backend_name=None):
+    backend_name = (backend_name or os.getenv("ASR_BACKEND", "openai")).lower()
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{backend_name}'")
+    with _backends_lock:
+        backend = _backends.get(backend_name)
+        if backend is None:
+            backend = _backends[backend_name] = BACKENDS[backend_name]()
+        return backend
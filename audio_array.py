@@ -0,0 +1,157 @@
+import os
+import struct
+
+import numpy as np
+
+from ingest import TARGET_SAMPLE_RATE
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioClip:
+    # A zero-copy view of part of an AudioArray. It exposes the attributes of
+    # pydub's AudioSegment that the chunk encoders and ASR backends read
+    # (frame_rate, channels, sample_width, raw_data, len() in milliseconds),
+    # so it can be used anywhere a chunk was.
+    channels = 1
+    sample_width = 2
+
+    def __init__(self, samples, frame_rate):
+        self.samples = samples
+        self.frame_rate = frame_rate
+
+    def __len__(self):
+        return int(round(len(self.samples) * 1000 / self.frame_rate))
+
+    @property
+    def raw_data(self):
+        return memoryview(np.ascontiguousarray(self.samples)).cast('B')
+
+    def get_array_of_samples(self):
+        return self.samples
+
+
+class AudioArray:
+    # Mono 16-bit audio at the model sample rate. For the normalised WAVs the
+    # ingest step writes, `samples` is a read-only memory map of the file's
+    # data chunk, so nothing is decoded and clips only touch the pages they use.
+
+    def __init__(self, samples, sample_rate=TARGET_SAMPLE_RATE, path=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.path = path
+
+    @property
+    def frames(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return self.frames / float(self.sample_rate)
+
+    def _bounds(self, start, end):
+        first = 0 if start is None else max(0, int(round(start * self.sample_rate)))
+        last = self.frames if end is None else min(self.frames, int(round(end * self.sample_rate)))
+        return first, max(first, last)
+
+    def _pieces(self, first, last):
+        # Views covering samples [first, last)
+        return [self.samples[first:last]]
+
+    def clip(self, start, end):
+        pieces = self._pieces(*self._bounds(start, end))
+        samples = pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+        return AudioClip(samples, self.sample_rate)
+
+    def pipeline_input(self, start=None, end=None):
+        # What pyannote takes instead of a path: a (channel, time) float tensor
+        import torch
+
+        first, last = self._bounds(start, end)
+        waveform = np.empty(last - first, dtype=np.float32)
+        position = 0
+        for piece in self._pieces(first, last):
+            np.multiply(piece, 1 / 32768.0, out=waveform[position:position + len(piece)], casting='unsafe')
+            position += len(piece)
+        return {'waveform': torch.from_numpy(waveform)[None], 'sample_rate': self.sample_rate}
+
+
+class SplicedAudioArray(AudioArray):
+    # Regions of one recording played back to back, as VAD keeps only the
+    # speech. Every region stays a view of the memory-mapped original; only a
+    # clip that spans a cut is copied, and only that clip.
+
+    def __init__(self, pieces, sample_rate=TARGET_SAMPLE_RATE, path=None):
+        self.pieces = [piece for piece in pieces if len(piece)]
+        self.sample_rate = sample_rate
+        self.path = path
+        self._starts = np.cumsum([0] + [len(piece) for piece in self.pieces])
+
+    @property
+    def frames(self):
+        return int(self._starts[-1])
+
+    def _pieces(self, first, last):
+        index = int(np.searchsorted(self._starts, first, side='right')) - 1
+        pieces = []
+        while first < last and index < len(self.pieces):
+            offset = first - int(self._starts[index])
+            take = min(last, int(self._starts[index + 1])) - first
+            pieces.append(self.pieces[index][offset:offset + take])
+            first += take
+            index += 1
+        return pieces or [np.zeros(0, dtype='<i2')]
+
+
+def riff_layout(wav_file):
+    # Walks the RIFF chunks of an open file and returns (fmt fields, data offset,
+    # declared data size), or None when it is not a WAV or the header is cut short
+    header = wav_file.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    fmt = None
+    while True:
+        chunk_header = wav_file.read(8)
+        if len(chunk_header) < 8:
+            return None
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+        if chunk_id == b'fmt ':
+            fmt_fields = wav_file.read(16)
+            if len(fmt_fields) < 16:
+                return None
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', fmt_fields)
+            fmt = {"format_tag": format_tag, "channels": channels, "sample_rate": sample_rate, "bits": bits}
+            wav_file.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b'data':
+            return (fmt, wav_file.tell(), chunk_size) if fmt is not None else None
+        else:
+            wav_file.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def pcm_data_layout(path):
+    # (fmt fields, data offset, data bytes), or None when the file is not a plain PCM WAV
+    with open(path, 'rb') as wav_file:
+        layout = riff_layout(wav_file)
+    if layout is None or layout[0]["format_tag"] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+        return None
+    fmt, offset, chunk_size = layout
+    # Streaming writers may leave the size as 0 or 0xFFFFFFFF; trust the file length then
+    available = os.path.getsize(path) - offset
+    size = chunk_size if 0 < chunk_size <= available else available
+    return fmt, offset, size
+
+
+def load_audio_array(path):
+    layout = pcm_data_layout(path)
+    if layout is not None:
+        fmt, offset, size = layout
+        if fmt["channels"] == 1 and fmt["sample_rate"] == TARGET_SAMPLE_RATE and fmt["bits"] == 16:
+            samples = np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(size // 2,))
+            return AudioArray(samples, TARGET_SAMPLE_RATE, path)
+
+    # Anything else (ingest normally prevents this) is decoded once, downmixed and resampled
+    from pydub import AudioSegment
+
+    segment = AudioSegment.from_file(path).set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(2)
+    return AudioArray(np.frombuffer(segment.raw_data, dtype='<i2'), TARGET_SAMPLE_RATE, path)
@@ -0,0 +1,55 @@
+import io
+import os
+import wave
+
+# Formats a chunk can be encoded to before upload. WAV is written with the
+# stdlib straight from the segment's PCM bytes; FLAC and Opus go through
+# libsndfile (soundfile), which encodes into the buffer without temp files.
+CHUNK_FORMATS = {
+    "wav": {"extension": "wav"},
+    "flac": {"extension": "flac", "sf_format": "FLAC", "sf_subtype": "PCM_16"},
+    "opus": {"extension": "ogg", "sf_format": "OGG", "sf_subtype": "OPUS"},
+}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def chunk_format_from_env():
+    audio_format = os.getenv("CHUNK_AUDIO_FORMAT", "wav").lower()
+    if audio_format not in CHUNK_FORMATS:
+        print(f"Unsupported CHUNK_AUDIO_FORMAT '{audio_format}', falling back to wav")
+        return "wav"
+    return audio_format
+
+
+def export_chunk_to_buffer(chunk, audio_format="wav"):
+    # Returns a BytesIO positioned at 0 with a `name` attribute, which is what
+    # openai.Audio.transcribe uses for the multipart filename and format sniffing.
+    spec = CHUNK_FORMATS[audio_format]
+    buffer = io.BytesIO()
+    if audio_format == "wav":
+        _write_wav(chunk, buffer)
+    else:
+        _write_soundfile(chunk, buffer, spec, audio_format)
+    buffer.seek(0)
+    buffer.name = f"chunk.{spec['extension']}"
+    return buffer
+
+
+def _write_wav(chunk, buffer):
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(chunk.channels)
+        wav_file.setsampwidth(chunk.sample_width)
+        wav_file.setframerate(chunk.frame_rate)
+        wav_file.writeframes(chunk.raw_data)
+
+
+def _write_soundfile(chunk, buffer, spec, audio_format):
+    import numpy as np
+    import soundfile as sf
+
+    if chunk.sample_width != 2:
+        chunk = chunk.set_sample_width(2)
+    if audio_format == "opus" and chunk.frame_rate not in OPUS_SAMPLE_RATES:
+        chunk = chunk.set_frame_rate(16000)
+    samples = np.frombuffer(chunk.raw_data, dtype=np.int16).reshape(-1, chunk.channels)
+    sf.write(buffer, samples, chunk.frame_rate, format=spec["sf_format"], subtype=spec["sf_subtype"])
@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Runs in the diarization worker processes. This module must not import app.py,
+# so that spawned workers load only pyannote and the audio helpers, not Flask.
+
+_worker_pool = None
+
+
+def _init_worker(auth_token, torch_threads):
+    global _worker_pool
+    import torch
+
+    from diarization_pool import get_diarization_pool
+
+    # Every process gets its share of the cores instead of each one using all of them
+    torch.set_num_threads(torch_threads)
+    _worker_pool = get_diarization_pool(auth_token=auth_token, size=1)
+
+
+def diarize_file(file_path, vad_options, streaming_options):
+    # Returns ([(start, end, speaker)], labels, {label: embedding}) on the
+    # VAD-trimmed timeline. Labels are ordered the way the inline pipeline
+    # numbers callers: sorted for whole-file diarization, by first appearance
+    # for windowed diarization.
+    from audio_array import load_audio_array
+    from streaming_diarization import StreamingDiarizer, embeddings_by_label, use_streaming_diarization
+    from vad import detect_speech
+
+    audio = detect_speech(load_audio_array(file_path), **vad_options).audio
+    if not audio.duration:
+        return [], [], {}
+    if use_streaming_diarization(audio.duration):
+        diarizer = StreamingDiarizer(_worker_pool, **streaming_options)
+        turns = [(turn.start, turn.end, turn.speaker) for window in diarizer.iter_turns(audio) for turn in window]
+        labels = list(dict.fromkeys(speaker for _, _, speaker in turns))
+        return turns, labels, diarizer.speaker_embeddings
+    diarization, embeddings = _worker_pool.diarize(audio.pipeline_input(), return_embeddings=True)
+    turns = [(turn.start, turn.end, label) for turn, _, label in diarization.itertracks(yield_label=True)]
+    return turns, sorted(diarization.labels()), embeddings_by_label(diarization.labels(), embeddings)
+
+
+def web_workers():
+    # gunicorn.conf.py exports its worker count; each worker starts its own pool
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def diarization_processes():
+    # Every process loads its own pyannote pipeline, so the cores are split
+    # between the gunicorn workers rather than each worker taking all of them
+    default = max(1, (os.cpu_count() or 1) // web_workers())
+    return max(1, int(os.getenv("BATCH_DIARIZATION_PROCESSES", str(default))))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_diarization_executor():
+    # Spawned rather than forked: torch and its thread pools don't survive fork()
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            processes = diarization_processes()
+            _executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(os.getenv("USER_AUTH_TOKEN"), max(1, (os.cpu_count() or 1) // (processes * web_workers()))),
+            )
+        return _executor
+
+
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_diarization(file_path, vad_options, streaming_options):
+    # A worker that dies (e.g. killed for memory) breaks the whole pool; it is
+    # replaced so only the files already in it fail, not every later batch
+    executor = get_diarization_executor()
+    try:
+        future = executor.submit(diarize_file, file_path, vad_options, streaming_options)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        executor = get_diarization_executor()
+        future = executor.submit(diarize_file, file_path, vad_options, streaming_options)
+
+    def discard_if_broken(done):
+        if isinstance(done.exception(), BrokenProcessPool):
+            _discard_executor(executor)
+
+    future.add_done_callback(discard_if_broken)
+    return future
+
+
+_batch_executor = None
+
+
+def get_batch_executor():
+    # One thread per file in flight: it downloads, waits on its diarization
+    # process and then feeds chunks to the shared transcription scheduler
+    global _batch_executor
+    with _executor_lock:
+        if _batch_executor is None:
+            workers = int(os.getenv("BATCH_FILE_WORKERS", str(2 * diarization_processes())))
+            _batch_executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch-file")
+        return _batch_executor
+
+
+class ContentDeduplicator:
+    # The first caller to claim a content hash does the work; later callers
+    # with the same audio wait for that result instead of repeating it.
+
+    def __init__(self):
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def claim(self, content_hash):
+        # Returns (future, owner). The owner must resolve the future.
+        with self._lock:
+            future = self._claims.get(content_hash)
+            if future is not None:
+                return future, False
+            future = self._claims[content_hash] = Future()
+            return future, True
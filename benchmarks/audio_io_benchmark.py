@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_buffers import export_chunk_to_buffer  # noqa: E402
+
+
+def synthetic_recording(seconds, sample_rate=16000, seed=0):
+    # Alternating "speakers" (different pitches) with a little noise and short pauses
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = np.where((t // 7) % 2 == 0, 180.0, 260.0)
+    signal = 0.3 * np.sin(2 * np.pi * pitch * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    signal += 0.02 * rng.standard_normal(t.shape)
+    signal[(t % 7) > 6.2] *= 0.05
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+
+
+def split_chunks(audio, chunk_seconds):
+    step = int(chunk_seconds * 1000)
+    return [audio[start:start + step] for start in range(0, len(audio), step)]
+
+
+def disk_round_trip(chunk):
+    # The previous transcribe_chunk path: export to a temp file, reopen, read, delete
+    with NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
+        chunk.export(temp_wav.name, format="wav")
+    with open(temp_wav.name, 'rb') as audio_file:
+        payload = audio_file.read()
+    os.remove(temp_wav.name)
+    return len(payload)
+
+
+def memory_round_trip(chunk, audio_format):
+    return len(export_chunk_to_buffer(chunk, audio_format).getvalue())
+
+
+def run_case(name, fn, chunks, audio_seconds):
+    started = time.perf_counter()
+    total_bytes = sum(fn(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14} {elapsed:8.3f}s {audio_seconds / elapsed:10.1f}x realtime "
+          f"{total_bytes / 1e6:9.2f} MB {len(chunks) / elapsed:9.1f} chunks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk export paths (disk vs memory, WAV vs FLAC/Opus).")
+    parser.add_argument("--minutes", type=float, default=30.0, help="length of the synthetic recording")
+    parser.add_argument("--chunk-seconds", type=float, default=8.0, help="length of each exported chunk")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--formats", default="wav,flac", help="comma separated in-memory formats to measure")
+    args = parser.parse_args()
+
+    audio = synthetic_recording(args.minutes * 60, sample_rate=args.sample_rate)
+    chunks = split_chunks(audio, args.chunk_seconds)
+    audio_seconds = len(audio) / 1000
+    print(f"{len(chunks)} chunks, {audio_seconds:.0f}s of audio at {args.sample_rate} Hz\n")
+    print(f"{'path':<14} {'time':>9} {'speed':>18} {'bytes':>12} {'throughput':>16}")
+
+    run_case("disk/wav", disk_round_trip, chunks, audio_seconds)
+    for audio_format in args.formats.split(","):
+        audio_format = audio_format.strip()
+        run_case(f"memory/{audio_format}", lambda chunk: memory_round_trip(chunk, audio_format), chunks, audio_seconds)
+
+
+if __name__ == '__main__':
+    main()
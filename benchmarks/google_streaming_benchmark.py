@@ -0,0 +1,307 @@
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = "thanks for calling how can i help you today my order never arrived let me check that for you".split()
+WORD_SECONDS = 0.4
+FORMATS = {
+    # name: (sample rate, channels, expected encoding, expected rate Google is told)
+    "mulaw8k": (8000, 1, "MULAW", 8000),
+    "pcm16k": (16000, 1, "LINEAR16", 16000),
+    "pcm8k": (8000, 1, "LINEAR16", 8000),
+    "stereo44k": (44100, 2, "LINEAR16", 16000),
+}
+
+
+def synthetic_script(duration, speakers, seed=0):
+    # [(start, end, word, speaker_tag)]: sentences of 3-9 words, each ending in
+    # punctuation, with the speaker changing between most sentences
+    rng = random.Random(seed)
+    script = []
+    position = 0.2
+    speaker = 1
+    while True:
+        length = rng.randint(3, 9)
+        if position + length * WORD_SECONDS > duration:
+            return script
+        for index in range(length):
+            word = rng.choice(WORDS)
+            if index == length - 1:
+                word += rng.choice(".?!")
+            script.append((position, position + WORD_SECONDS * 0.9, word, speaker))
+            position += WORD_SECONDS
+        position += rng.uniform(0.2, 1.0)
+        if speakers > 1 and rng.random() < 0.8:
+            speaker = speaker % speakers + 1
+
+
+def expected_lines(script):
+    labels = {}
+    lines = []
+    words = []
+    for _, _, word, tag in script:
+        label = labels.setdefault(tag, f"Speaker {len(labels) + 1}")
+        words.append(word)
+        if word[-1] in ".?!":
+            lines.append(f"{label}: {' '.join(words)}")
+            words = []
+    return lines
+
+
+def synthetic_wav(duration, format_name):
+    sample_rate, channels, encoding, _ = FORMATS[format_name]
+    frames = int(duration * sample_rate)
+    if encoding == "MULAW":
+        # A non-PCM WAV: format tag 7 and a fact chunk before the data, as telephony systems write them
+        data = b'\xff' * frames
+        fmt = struct.pack('<HHIIHH', 7, 1, sample_rate, sample_rate, 1, 8) + b'\x00\x00'
+        fact = struct.pack('<I', frames)
+        body = (b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'fact' + struct.pack('<I', 4) + fact
+                + b'data' + struct.pack('<I', len(data)) + data)
+        return b'RIFF' + struct.pack('<I', len(body)) + body
+    rng = np.random.default_rng(0)
+    pcm = (0.01 * rng.standard_normal(frames * channels) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def fake_speech_module():
+    # Stands in for google.cloud.speech_v1p1beta1 when it is not installed
+
+    class Message:
+
+        def __init__(self, **fields):
+            self.__dict__.update(fields)
+
+    class RecognitionConfig(Message):
+        AudioEncoding = types.SimpleNamespace(LINEAR16="LINEAR16", MULAW="MULAW", FLAC="FLAC")
+
+    module = types.ModuleType("google.cloud.speech_v1p1beta1")
+    module.RecognitionConfig = RecognitionConfig
+    module.SpeakerDiarizationConfig = type("SpeakerDiarizationConfig", (Message,), {})
+    module.StreamingRecognitionConfig = type("StreamingRecognitionConfig", (Message,), {})
+    module.StreamingRecognizeRequest = type("StreamingRecognizeRequest", (Message,), {})
+    module.RecognitionAudio = type("RecognitionAudio", (Message,), {})
+    return module
+
+
+class FakeSpeechClient:
+    # Answers streaming_recognize from the script: a word is "recognised" once
+    # the audio up to its end has been received. Interim results grow word by
+    # word; a final result closes each sentence. With repeat_words, final
+    # results repeat every earlier word of the session. With tags_at_end, as
+    # Google streaming does with diarization on, per-sentence finals carry
+    # speaker_tag 0 and only one cumulative final result at the end of the
+    # session, holding every word of it, is tagged. Word times are relative to
+    # the session start.
+
+    def __init__(self, script, repeat_words=False, tags_at_end=False):
+        self.script = script
+        self.repeat_words = repeat_words
+        self.tags_at_end = tags_at_end
+        self.received_seconds = 0.0
+        self.sessions = []
+        self._next = 0
+
+    def streaming_recognize(self, config, requests):
+        recognition = config.config
+        encoding = str(getattr(recognition.encoding, "name", recognition.encoding))
+        bytes_per_second = recognition.sample_rate_hertz * (1 if encoding == "MULAW" else 2)
+        session_start = self.received_seconds
+        self.sessions.append({"encoding": encoding, "sample_rate": recognition.sample_rate_hertz,
+                              "start": session_start})
+        session_words = []
+        pending = []
+        for request in requests:
+            self.received_seconds += len(request.audio_content) / float(bytes_per_second)
+            while self._next < len(self.script) and self.script[self._next][1] <= self.received_seconds:
+                start, end, word, tag = self.script[self._next]
+                self._next += 1
+                pending.append(self._word(word, start - session_start, end - session_start, tag))
+                if word[-1] in ".?!":
+                    yield self._final(session_words, pending)
+                    pending = []
+                else:
+                    yield self._response(" ".join(w.word for w in pending), [], False)
+        if pending:
+            yield self._final(session_words, pending)
+        if self.tags_at_end and session_words:
+            yield self._response(" ".join(w.word for w in session_words), session_words, True)
+
+    def _final(self, session_words, pending):
+        session_words.extend(pending)
+        words = list(session_words) if self.repeat_words else pending
+        if self.tags_at_end:
+            words = [types.SimpleNamespace(**dict(vars(w), speaker_tag=0)) for w in words]
+        return self._response(" ".join(w.word for w in pending), words, True)
+
+    def _word(self, word, start, end, tag):
+        return types.SimpleNamespace(word=word, start_time=datetime.timedelta(seconds=max(0.0, start)),
+                                     end_time=datetime.timedelta(seconds=max(0.0, end)), speaker_tag=tag)
+
+    def _response(self, transcript, words, is_final):
+        alternative = types.SimpleNamespace(transcript=transcript, words=words)
+        result = types.SimpleNamespace(alternatives=[alternative], is_final=is_final, stability=0.0 if is_final else 0.8)
+        return types.SimpleNamespace(results=[result])
+
+
+def throttled_server(payload, bytes_per_second):
+    # Serves the recording slowly, like a remote recording store, so the
+    # difference between "after the download" and "during it" is visible
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            piece = 8192
+            for offset in range(0, len(payload), piece):
+                self.wfile.write(payload[offset:offset + piece])
+                time.sleep(piece / float(bytes_per_second))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /transcribe/google/stream against a fake Speech client.")
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the synthetic recording")
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="mulaw8k")
+    parser.add_argument("--speed", type=float, default=4.0, help="download speed as a multiple of real time")
+    parser.add_argument("--session-seconds", type=float, default=20.0, help="GOOGLE_STREAM_SESSION_SECONDS")
+    parser.add_argument("--repeat-words", action="store_true", help="final results repeat earlier words")
+    parser.add_argument("--tags-at-end", action="store_true",
+                        help="only a cumulative final result at the end of each session has speaker tags, as from Google")
+    parser.add_argument("--upload", action="store_true", help="post the file instead of a URL")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="voxid-google-stream-")
+    os.environ.update({
+        "API_TOKEN": "benchmark",
+        "GOOGLE_STREAM_SESSION_SECONDS": str(args.session_seconds),
+        "JOB_STORE_PATH": os.path.join(work_dir, "jobs.sqlite3"),
+        "DIARIZATION_WARMUP": "0",
+        "PRELOAD_MODELS": "",
+    })
+    try:
+        from google.cloud import speech_v1p1beta1  # noqa: F401
+    except ImportError:
+        google = sys.modules.setdefault("google", types.ModuleType("google"))
+        google.cloud = sys.modules.setdefault("google.cloud", types.ModuleType("google.cloud"))
+        google.cloud.speech_v1p1beta1 = sys.modules["google.cloud.speech_v1p1beta1"] = fake_speech_module()
+
+    script = synthetic_script(args.seconds, args.speakers, args.seed)
+    client = FakeSpeechClient(script, args.repeat_words, args.tags_at_end)
+
+    import requests
+    from werkzeug.serving import make_server
+
+    os.chdir(ROOT)
+    os.makedirs("tmp", exist_ok=True)
+    import app
+    import google_streaming
+
+    google_streaming.get_speech_client = lambda: client
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    payload = synthetic_wav(args.seconds, args.format)
+    sample_rate, channels, expected_encoding, expected_rate = FORMATS[args.format]
+    download_speed = args.speed * len(payload) / args.seconds
+    audio_server = throttled_server(payload, download_speed)
+    endpoint = f"http://127.0.0.1:{server.server_port}/transcribe/google/stream"
+    print(f"{args.seconds:.0f}s {args.format} recording ({len(payload)} bytes), downloaded at {args.speed:g}x real time, "
+          f"{len(script)} words\n")
+
+    started = time.perf_counter()
+    if args.upload:
+        response = requests.post(endpoint, headers={"Authorization": "benchmark"}, stream=True,
+                                 files={"file": ("call.wav", payload, "audio/wav")})
+    else:
+        response = requests.post(endpoint, headers={"Authorization": "benchmark"}, stream=True,
+                                 data={"url": f"http://127.0.0.1:{audio_server.server_port}/call.wav"})
+    first = {}
+    sentences = []
+    done = None
+    for line in response.iter_lines():
+        event = json.loads(line)
+        first.setdefault(event["type"], time.perf_counter() - started)
+        if event["type"] == "sentence":
+            sentences.append(f"{event['speaker']}: {event['sentence']}")
+        elif event["type"] == "done":
+            done = event
+        elif event["type"] == "error":
+            print(f"error: {event['error']}")
+    total = time.perf_counter() - started
+    server.shutdown()
+    audio_server.shutdown()
+
+    expected = expected_lines(script)
+    download_seconds = None if args.upload else len(payload) / download_speed
+    report = {
+        "format": args.format,
+        "audio_seconds": args.seconds,
+        "download_seconds": round(download_seconds, 3) if download_seconds else None,
+        "first_interim_seconds": round(first["interim"], 3) if "interim" in first else None,
+        "first_sentence_seconds": round(first["sentence"], 3) if "sentence" in first else None,
+        "total_seconds": round(total, 3),
+        "sentences": len(sentences),
+        "sessions": len(client.sessions),
+        "encoding": done and done["encoding"],
+        "sample_rate": done and done["sample_rate"],
+        "matches_script": sentences == expected and done is not None and done["transcription"] == expected,
+    }
+    print(f"first interim        {report['first_interim_seconds']}s" if "interim" in first else "first interim        -")
+    print(f"first sentence       {report['first_sentence_seconds']}s" if "sentence" in first else "first sentence       -")
+    if download_seconds:
+        print(f"done                 {report['total_seconds']}s (the download alone takes {report['download_seconds']}s)")
+    else:
+        print(f"done                 {report['total_seconds']}s")
+    print(f"sentences            {len(sentences)} / {len(expected)} expected")
+    print(f"sessions             {report['sessions']}")
+    print(f"encoding             {report['encoding']} at {report['sample_rate']} Hz")
+    print(f"matches script       {report['matches_script']}")
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+    ok = report["matches_script"] and report["encoding"] == expected_encoding and report["sample_rate"] == expected_rate
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
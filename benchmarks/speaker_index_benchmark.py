@@ -0,0 +1,121 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def unit(vector):
+    return vector / np.linalg.norm(vector)
+
+
+def voices(count, dim, seed):
+    # One fixed direction per synthetic speaker
+    rng = np.random.default_rng(seed)
+    return np.stack([unit(vector) for vector in rng.standard_normal((count, dim))])
+
+
+def heard(voice, noise, rng):
+    # The same voice on another call: cosine to the voice is about 1 / sqrt(1 + noise^2)
+    return voice + noise * unit(rng.standard_normal(voice.shape[0]))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def enroll(path, threshold, speakers, dim, seed, worker, workers, noise):
+    # Each process enrols its share of the speakers, two per call, into the same directory
+    from speaker_index import SpeakerIndex
+
+    index = SpeakerIndex(path, threshold)
+    rng = np.random.default_rng(seed + worker + 1)
+    known = voices(speakers, dim, seed)
+    mine = list(range(worker, speakers, workers))
+    ids = {}
+    for offset in range(0, len(mine), 2):
+        call = mine[offset:offset + 2]
+        for voice, match in zip(call, index.identify([heard(known[voice], noise, rng) for voice in call])):
+            ids[voice] = match.speaker_id
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrol synthetic speakers in a speaker index and time re-identification.")
+    parser.add_argument("--speakers", type=int, default=5000, help="speakers enrolled before the timed calls")
+    parser.add_argument("--dim", type=int, default=256, help="embedding size (pyannote 3.1 uses 256)")
+    parser.add_argument("--calls", type=int, default=2000, help="timed calls, each with two known speakers")
+    parser.add_argument("--noise", type=float, default=0.6,
+                        help="per-call embedding noise; two calls of one speaker then have cosine ~0.74")
+    parser.add_argument("--threshold", type=float, default=0.6, help="SPEAKER_INDEX_THRESHOLD")
+    parser.add_argument("--processes", type=int, default=4, help="processes enrolling into the index at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    from speaker_index import SpeakerIndex
+
+    path = tempfile.mkdtemp(prefix="voxid-speakers-")
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        parts = pool.starmap(enroll, [(path, args.threshold, args.speakers, args.dim, args.seed, worker,
+                                       args.processes, args.noise) for worker in range(args.processes)])
+    enroll_seconds = time.perf_counter() - started
+    enrolled = {}
+    for part in parts:
+        enrolled.update(part)
+
+    index = SpeakerIndex(path, args.threshold)
+    rows = index.stats()["speakers"]
+    known = voices(args.speakers, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 10000)
+    call_seconds = []
+    correct = 0
+    for _ in range(args.calls):
+        call = rng.choice(args.speakers, size=2, replace=False)
+        started = time.perf_counter()
+        matches = index.identify([heard(known[voice], args.noise, rng) for voice in call])
+        call_seconds.append(time.perf_counter() - started)
+        correct += sum(1 for voice, match in zip(call, matches) if not match.new and match.speaker_id == enrolled[voice])
+
+    stats = index.stats()
+    report = {
+        "speakers": args.speakers,
+        "dim": args.dim,
+        "processes": args.processes,
+        "enroll_seconds": round(enroll_seconds, 3),
+        "rows": rows,
+        "distinct_ids": len(set(enrolled.values())),
+        "lookup_ms_avg": round(stats["lookup_seconds_avg"] * 1000, 4),
+        "lookup_ms_max": round(stats["lookup_seconds_max"] * 1000, 4),
+        "call_ms_p50": round(percentile(call_seconds, 0.50) * 1000, 4),
+        "call_ms_p99": round(percentile(call_seconds, 0.99) * 1000, 4),
+        "reidentified": round(correct / (2.0 * args.calls), 4),
+        "enrolled_by_mistake": stats["speakers"] - rows,
+        "index_bytes": sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)),
+    }
+    print(f"{args.speakers} speakers x {args.dim} dims enrolled by {args.processes} processes "
+          f"in {report['enroll_seconds']}s\n")
+    print(f"rows / distinct ids  {report['rows']} / {report['distinct_ids']}")
+    print(f"lookup avg / max     {report['lookup_ms_avg']} ms / {report['lookup_ms_max']} ms")
+    print(f"call p50 / p99       {report['call_ms_p50']} ms / {report['call_ms_p99']} ms (lock, lookup, update, flush)")
+    print(f"re-identified        {report['reidentified']:.2%} ({report['enrolled_by_mistake']} enrolled as new speakers)")
+    print(f"index on disk        {report['index_bytes'] / 1e6:.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+    if report["rows"] != args.speakers or report["distinct_ids"] != args.speakers:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spellcheck import SPACY_MODEL, SpellcheckService, load_lean_nlp  # noqa: E402
+
+VOCABULARY = (
+    "hello thank you for calling how can i help today my account was charged twice last month "
+    "please confirm your address and date of birth the payment should arrive within three business "
+    "days is there anything else i can do for you have a great afternoon goodbye"
+).split()
+
+
+def synthetic_corpus(documents, words_per_document, typo_rate=0.08, seed=0):
+    rng = random.Random(seed)
+
+    def typo(word):
+        if len(word) < 3:
+            return word
+        index = rng.randrange(len(word))
+        return word[:index] + word[index + 1:]
+
+    corpus = []
+    for _ in range(documents):
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_document)]
+        words = [typo(word) if rng.random() < typo_rate else word for word in words]
+        corpus.append(" ".join(words).capitalize() + ".")
+    return corpus
+
+
+def baseline(nlp, spell, corpus):
+    # The original /spellcheck: full pipeline, one request at a time, uncached lookups
+    results = []
+    for text in corpus:
+        doc = nlp(text)
+        results.append([{'word': token.text} for token in doc if not token.is_punct and token.text.lower() not in spell])
+    return results
+
+
+def timed(name, fn, documents):
+    started = time.perf_counter()
+    results = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<32} {elapsed:8.3f}s {documents / elapsed:10.1f} docs/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-request full spaCy pipeline with the lean batch spellchecker.")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=60, help="words per document")
+    parser.add_argument("--n-process", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    import spacy
+    from spellchecker import SpellChecker
+
+    corpus = synthetic_corpus(args.documents, args.words)
+    spell = SpellChecker()
+    full_nlp = spacy.load(SPACY_MODEL)
+    service = SpellcheckService(load_lean_nlp(), spell)
+
+    print(f"{args.documents} documents x {args.words} words\n")
+    before = timed("before: full pipeline, per doc", lambda: baseline(full_nlp, spell, corpus), args.documents)
+    after = timed("after: lean nlp.pipe + LRU (cold)", lambda: service.check_batch(
+        corpus, n_process=args.n_process, batch_size=args.batch_size), args.documents)
+    timed("after: lean nlp.pipe + LRU (warm)", lambda: service.check_batch(
+        corpus, n_process=args.n_process, batch_size=args.batch_size), args.documents)
+    timed("after: with candidates", lambda: service.check_batch(
+        corpus, with_candidates=True, n_process=args.n_process, batch_size=args.batch_size), args.documents)
+
+    mismatches = sum(1 for old, new in zip(before, after) if [w['word'] for w in old] != [w['word'] for w in new])
+    print(f"\nresult mismatches: {mismatches}")
+    print(f"cache: {service.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
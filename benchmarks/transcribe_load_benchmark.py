@@ -0,0 +1,371 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_RATE = 16000
+SPEAKER_PITCHES = (140.0, 210.0, 270.0, 330.0, 110.0, 390.0)
+WORDS = "thanks for calling how can i help you today my order never arrived let me check that for you".split()
+
+
+def synthetic_turns(duration, speakers, seed=0, holds=0.0):
+    # The same (start, end, speaker) plan is used to render the audio and by the
+    # stand-in diarization pipeline, so the "diarization" matches the recording.
+    # `holds` is the chance that a pause is a 5-20 s stretch of silence instead.
+    rng = random.Random(seed)
+    turns = []
+    position = 0.0
+    speaker = 0
+    while position < duration:
+        length = min(rng.uniform(1.5, 9.0), duration - position)
+        turns.append((position, position + length, f"SPEAKER_{speaker:02d}"))
+        position += length + (rng.uniform(5.0, 20.0) if rng.random() < holds else rng.uniform(0.1, 0.8))
+        speaker = (speaker + rng.randrange(1, speakers)) % speakers if speakers > 1 else 0
+    return turns
+
+
+def synthetic_wav(duration, speakers, seed=0, holds=0.0):
+    rng = np.random.default_rng(seed)
+    signal = 0.01 * rng.standard_normal(int(duration * SAMPLE_RATE))
+    for start, end, label in synthetic_turns(duration, speakers, seed, holds):
+        first, last = int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)
+        t = np.arange(last - first) / SAMPLE_RATE
+        pitch = SPEAKER_PITCHES[int(label.rsplit("_", 1)[1]) % len(SPEAKER_PITCHES)]
+        signal[first:last] += 0.3 * np.sin(2 * np.pi * pitch * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def unique_copy(wav_bytes, index):
+    # Flip the last few samples so every request has a distinct content hash
+    # and misses the result cache, like real traffic would
+    data = bytearray(wav_bytes)
+    data[-4:] = index.to_bytes(4, "little", signed=False)
+    return bytes(data)
+
+
+class Counter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+
+def jittered(latency, jitter, rng):
+    return max(0.0, latency * (1 + rng.uniform(-jitter, jitter)))
+
+
+def speaker_embedding(label, seed, rng, dim=256, noise=0.3):
+    # A fixed direction per synthetic speaker plus per-call noise, so the same
+    # speaker embeds close to, but never exactly at, where it did last time
+    base = np.random.default_rng(seed * 1000 + int(label.rsplit("_", 1)[1])).standard_normal(dim)
+    base /= np.linalg.norm(base)
+    return base + noise * rng.standard_normal(dim) / np.sqrt(dim)
+
+
+class StubAnnotation:
+    # Just the parts of pyannote.core.Annotation the pipeline uses
+
+    def __init__(self, turns):
+        self._turns = turns
+
+    def labels(self):
+        return sorted({label for _, _, label in self._turns})
+
+    def itertracks(self, yield_label=False):
+        for start, end, label in self._turns:
+            segment = types.SimpleNamespace(start=start, end=end)
+            yield (segment, None, label) if yield_label else (segment, None)
+
+
+def install_stubs(args, counter):
+    import openai
+    import openai.error
+
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+
+    def sample(latency):
+        with rng_lock:
+            return jittered(latency, args.jitter, rng), rng.random()
+
+    def whisper_call(file):
+        counter.add("whisper_calls")
+        counter.add("whisper_bytes", len(file.getvalue()) if hasattr(file, "getvalue") else 0)
+        return sample(args.asr_latency)
+
+    def whisper_response(roll, response_format):
+        if roll < args.asr_failure_rate:
+            counter.add("whisper_failures")
+            raise openai.error.RateLimitError("stubbed rate limit")
+        text = " ".join(WORDS[:8])
+        if response_format == "verbose_json":
+            words = [{"word": word, "start": 0.3 * i, "end": 0.3 * i + 0.25} for i, word in enumerate(text.split())]
+            return {"text": text, "words": words}
+        return {"text": text}
+
+    def transcribe(model, file, response_format="json", **kwargs):
+        delay, roll = whisper_call(file)
+        time.sleep(delay)
+        return whisper_response(roll, response_format)
+
+    async def atranscribe(model, file, response_format="json", **kwargs):
+        delay, roll = whisper_call(file)
+        await asyncio.sleep(delay)
+        return whisper_response(roll, response_format)
+
+    def chat_completion(model, messages, **kwargs):
+        counter.add("chat_calls")
+        delay, roll = sample(args.chat_latency)
+        time.sleep(delay)
+        if roll < args.chat_failure_rate:
+            counter.add("chat_failures")
+            raise openai.error.APIError("stubbed API error")
+        text = messages[-1]["content"].split("\n\n", 1)[-1]
+        return {"choices": [{"message": {"content": text}}]}
+
+    openai.Audio.transcribe = staticmethod(transcribe)
+    openai.Audio.atranscribe = staticmethod(atranscribe)
+    openai.ChatCompletion.create = staticmethod(chat_completion)
+
+    class StubPipeline:
+
+        @classmethod
+        def from_pretrained(cls, model_name, use_auth_token=None):
+            counter.add("pipeline_loads")
+            time.sleep(args.pipeline_load_seconds)
+            return cls()
+
+        def __call__(self, audio, **kwargs):
+            counter.add("diarization_calls")
+            if isinstance(audio, dict) and 'waveform' in audio:
+                duration = audio['waveform'].shape[-1] / float(audio['sample_rate'])
+            else:
+                path = audio['audio'] if isinstance(audio, dict) else audio
+                with wave.open(path, 'rb') as wav_file:
+                    duration = wav_file.getnframes() / float(wav_file.getframerate())
+            time.sleep(duration * args.diarization_rtf)
+            annotation = StubAnnotation(synthetic_turns(duration, args.speakers, args.seed))
+            if not kwargs.get("return_embeddings"):
+                return annotation
+            with rng_lock:
+                embeddings = np.stack([speaker_embedding(label, args.seed, np.random.default_rng(rng.getrandbits(32)))
+                                       for label in annotation.labels()])
+            return annotation, embeddings
+
+    # Stand in for pyannote.audio whether or not it is installed
+    pyannote = types.ModuleType("pyannote")
+    pyannote_audio = types.ModuleType("pyannote.audio")
+    pyannote_audio.Pipeline = StubPipeline
+    pyannote.audio = pyannote_audio
+    sys.modules["pyannote"] = pyannote
+    sys.modules["pyannote.audio"] = pyannote_audio
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        # Waveforms are handed to the stub pipeline as plain arrays on boxes without torch
+        torch = types.ModuleType("torch")
+        torch.from_numpy = lambda array: array
+        sys.modules["torch"] = torch
+
+    class StubLanguageId:
+
+        def predict(self, text, k=1):
+            # Like fastText, a list of texts gives one (labels, probabilities) pair per text
+            counter.add("language_id_calls")
+            if isinstance(text, list):
+                return [(f"__label__{args.language}",) * k for _ in text], [np.full(k, 1.0 / k) for _ in text]
+            return (f"__label__{args.language}",) * k, np.full(k, 1.0 / k)
+
+    from resources import registry
+
+    registry.register("language_id", StubLanguageId)
+
+
+def configure_environment(args, work_dir):
+    os.environ.update({
+        "API_TOKEN": "benchmark",
+        "RESULT_CACHE_BACKEND": "memory",
+        "JOB_STORE_PATH": os.path.join(work_dir, "jobs.sqlite3"),
+        "STREAMING_DIARIZATION": "0",
+        "DIARIZATION_WARMUP": "0",
+        "PRELOAD_MODELS": "",
+        "DIARIZATION_POOL_SIZE": str(args.diarization_pool_size),
+        "TRANSCRIBE_CONCURRENCY": str(args.asr_concurrency),
+        "TRANSCRIBE_ASYNC": "1" if args.asr_async else "0",
+        "TRANSCRIBE_REQUESTS_PER_MINUTE": str(args.rpm),
+        "TRANSCRIBE_BACKOFF_SECONDS": str(args.backoff),
+        "TRANSCRIPT_TRANSLATION_BACKEND": "openai",
+        "SPEAKER_INDEX_PATH": os.path.join(work_dir, "speakers") if args.speaker_index else "",
+    })
+
+
+def sample_thread_count(stop, peak):
+    while not stop.wait(0.05):
+        peak[0] = max(peak[0], threading.active_count())
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /transcribe under concurrent load with stubbed OpenAI and pyannote.")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="clients posting at the same time")
+    parser.add_argument("--seconds", type=float, default=120.0, help="length of each synthetic recording")
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument("--holds", type=float, default=0.0, help="share of pauses that are long silent holds")
+    parser.add_argument("--asr-latency", type=float, default=0.3, help="mean stubbed Whisper latency (s)")
+    parser.add_argument("--asr-failure-rate", type=float, default=0.0)
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="mean stubbed gpt-4o latency (s)")
+    parser.add_argument("--chat-failure-rate", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency varies by +/- this fraction")
+    parser.add_argument("--diarization-rtf", type=float, default=0.02, help="stubbed diarization seconds per audio second")
+    parser.add_argument("--pipeline-load-seconds", type=float, default=0.0)
+    parser.add_argument("--diarization-pool-size", type=int, default=1)
+    parser.add_argument("--asr-concurrency", type=int, default=4, help="TRANSCRIBE_CONCURRENCY")
+    parser.add_argument("--asr-async", type=int, choices=(0, 1), default=1,
+                        help="TRANSCRIBE_ASYNC: Whisper calls on the event loop (1) or on scheduler threads (0)")
+    parser.add_argument("--rpm", type=float, default=0, help="TRANSCRIBE_REQUESTS_PER_MINUTE (0 = unlimited)")
+    parser.add_argument("--backoff", type=float, default=0.05, help="TRANSCRIBE_BACKOFF_SECONDS")
+    parser.add_argument("--language", default="en", help="language the stubbed fastText model reports")
+    parser.add_argument("--speaker-index", action="store_true",
+                        help="label speakers from a fresh cross-call speaker index (SPEAKER_INDEX_PATH)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-p95", type=float, help="exit non-zero if p95 latency exceeds this many seconds")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="voxid-bench-")
+    configure_environment(args, work_dir)
+    counter = Counter()
+    install_stubs(args, counter)
+
+    import requests
+    from werkzeug.serving import make_server
+
+    os.chdir(ROOT)
+    os.makedirs("tmp", exist_ok=True)
+    import app
+
+    service = app.app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, service, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/transcribe"
+
+    wav_bytes = synthetic_wav(args.seconds, args.speakers, args.seed, args.holds)
+    print(f"{args.requests} requests x {args.seconds:.0f}s audio, {args.speakers} speakers, "
+          f"concurrency {args.concurrency}\n")
+
+    session_local = threading.local()
+
+    def post(index):
+        session = getattr(session_local, "session", None)
+        if session is None:
+            session = session_local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.post(url, headers={"Authorization": "benchmark"}, data={"timings": "1"},
+                                files={"file": (f"bench_{index}.wav", unique_copy(wav_bytes, index), "audio/wav")})
+        return response.status_code, time.perf_counter() - started, response.json()
+
+    stop_sampling = threading.Event()
+    peak_threads = [threading.active_count()]
+    threading.Thread(target=sample_thread_count, args=(stop_sampling, peak_threads), daemon=True).start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+        results = list(clients.map(post, range(args.requests)))
+    wall = time.perf_counter() - started
+    stop_sampling.set()
+    server.shutdown()
+
+    latencies = [latency for status, latency, _ in results if status == 200]
+    errors = sum(1 for status, _, _ in results if status != 200)
+    audio_hours = len(latencies) * args.seconds / 3600.0
+    stage_seconds = {}
+    pipeline_counts = {}
+    for status, _, body in results:
+        timings = body.get("timings", {}) if status == 200 else {}
+        for stage, stats in timings.get("stages", {}).items():
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + stats["seconds"]
+        for name, value in timings.get("counts", {}).items():
+            pipeline_counts[name] = pipeline_counts.get(name, 0) + value
+    # Every request carries the same synthetic speakers, so with the index on they should share ids
+    speaker_labels = sorted({tuple(sorted(body.get("speakers", {}))) for status, _, body in results if status == 200})
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss = peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+    report = {
+        "requests": args.requests,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(latencies) / wall, 3),
+        "latency_p50": round(percentile(latencies, 0.50), 4) if latencies else None,
+        "latency_p95": round(percentile(latencies, 0.95), 4) if latencies else None,
+        "audio_hours": round(audio_hours, 4),
+        "whisper_calls_per_audio_hour": round(counter.values.get("whisper_calls", 0) / audio_hours, 1) if audio_hours else None,
+        "chat_calls_per_audio_hour": round(counter.values.get("chat_calls", 0) / audio_hours, 1) if audio_hours else None,
+        "peak_rss_bytes": peak_rss,
+        "peak_threads": peak_threads[0],
+        "calls": counter.values,
+        "mean_stage_seconds": {stage: round(total / max(1, len(latencies)), 4) for stage, total in stage_seconds.items()},
+        "pipeline_counts": {name: round(value, 3) for name, value in pipeline_counts.items()},
+        "speaker_label_sets": [list(labels) for labels in speaker_labels],
+    }
+
+    print(f"requests/sec         {report['requests_per_second']}")
+    print(f"latency p50 / p95    {report['latency_p50']}s / {report['latency_p95']}s")
+    print(f"errors               {errors}")
+    print(f"Whisper calls/hour   {report['whisper_calls_per_audio_hour']}")
+    print(f"gpt-4o calls/hour    {report['chat_calls_per_audio_hour']}")
+    print(f"peak RSS             {peak_rss / 1e6:.1f} MB")
+    print(f"peak threads         {peak_threads[0]}")
+    print("mean seconds per request by stage:")
+    for stage, seconds in report["mean_stage_seconds"].items():
+        print(f"  {stage:<16} {seconds:8.4f}")
+    for name, value in report["pipeline_counts"].items():
+        print(f"{name:<20} {value}")
+    if args.speaker_index:
+        print(f"speaker labels       {', '.join(' / '.join(labels) for labels in speaker_labels)}")
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+    if args.max_p95 is not None and (report["latency_p95"] is None or report["latency_p95"] > args.max_p95):
+        print(f"p95 latency above {args.max_p95}s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+ChunkResult = namedtuple("ChunkResult", ["start_time", "item", "text", "latency", "attempts", "error"])
+
+
+class TokenBucket:
+    # Classic token bucket: `rate` tokens are added per second up to `capacity`.
+    # acquire() blocks until a token is available, so callers are paced rather
+    # than rejected.
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens=1):
+        # Takes the tokens and returns 0, or returns how long to wait before trying again
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        while True:
+            wait = self.reserve(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        while True:
+            wait = self.reserve(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class ChunkScheduler:
+    # Shared executor for per-chunk ASR calls. Concurrency is bounded by the
+    # worker count, submissions block once `max_pending` chunks are queued,
+    # every attempt (including retries) takes a token from the rate limiter,
+    # and map() always hands results back sorted by chunk start time.
+    asynchronous = False
+
+    def __init__(self, max_workers=4, requests_per_minute=None, max_retries=3,
+                 backoff_seconds=1.0, max_backoff_seconds=30.0, max_pending=None, default=""):
+        self.max_workers = max(1, int(max_workers))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.default = default
+        self._bucket = None
+        if requests_per_minute:
+            self._bucket = TokenBucket(requests_per_minute / 60.0, capacity=self.max_workers)
+        self._executor = self._create_executor()
+        self._pending = threading.BoundedSemaphore(max_pending or self.max_workers * 4)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._completed = 0
+        self._failed = 0
+        self._retries = 0
+        self._in_flight = 0
+
+    def _create_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chunk-asr")
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def _started(self):
+        with self._lock:
+            self._in_flight += 1
+        return time.perf_counter()
+
+    def _should_retry(self, error, attempts, start_time):
+        if attempts > self.max_retries:
+            print(f"Error during chunk transcription at {start_time:.2f}s after {attempts} attempt(s): {error}")
+            return False
+        with self._lock:
+            self._retries += 1
+        return True
+
+    def _finished(self, fn_result, item, start_time, started, attempts, error):
+        self._pending.release()
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._latencies.append(latency)
+            if error is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+        return ChunkResult(start_time, item, fn_result if error is None else self.default, latency, attempts, error)
+
+    def _run(self, fn, item, start_time):
+        started = self._started()
+        attempts = 0
+        error = None
+        text = self.default
+        try:
+            while True:
+                if self._bucket is not None:
+                    self._bucket.acquire()
+                attempts += 1
+                try:
+                    text = fn(item)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    if not self._should_retry(e, attempts, start_time):
+                        break
+                    time.sleep(self._backoff(attempts - 1))
+        finally:
+            result = self._finished(text, item, start_time, started, attempts, error)
+        return result
+
+    def submit(self, fn, item, start_time):
+        # Blocks while the queue is full, which pushes back on whoever is
+        # producing chunks instead of buffering them without limit.
+        self._pending.acquire()
+        try:
+            return self._executor.submit(self._run, fn, item, start_time)
+        except Exception:
+            self._pending.release()
+            raise
+
+    def map(self, fn, items, start_time=lambda item: item[2], on_result=None, presorted=False):
+        # Chunks are submitted in start-time order and `on_result` fires for
+        # each one as soon as it and every earlier chunk have finished, so a
+        # caller can stream an in-order transcript while later chunks run.
+        # With presorted=True `items` may be a generator that is consumed
+        # lazily, e.g. turns coming out of a diarizer that is still running.
+        ordered = items if presorted else sorted(items, key=start_time)
+        futures = []
+        results = []
+
+        def drain(block):
+            while len(results) < len(futures) and (block or futures[len(results)].done()):
+                result = futures[len(results)].result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+
+        for item in ordered:
+            futures.append(self.submit(fn, item, start_time(item)))
+            drain(block=False)
+        drain(block=True)
+        return results
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "asynchronous": self.asynchronous,
+                "max_workers": self.max_workers,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "retries": self._retries,
+                "latency_p50": _percentile(latencies, 0.50),
+                "latency_p95": _percentile(latencies, 0.95),
+                "latency_max": round(latencies[-1], 4) if latencies else None,
+            }
+
+
+class AsyncChunkScheduler(ChunkScheduler):
+    # Same contract as ChunkScheduler, except `fn` returns a coroutine. All
+    # calls run on one shared event-loop thread, so a chunk waiting on the API
+    # is a suspended coroutine rather than a parked thread and max_workers can
+    # go up to the provider's concurrency limit without adding threads.
+    asynchronous = True
+
+    def _create_executor(self):
+        self._slots = None
+        return None
+
+    async def _run_async(self, fn, item, start_time):
+        if self._slots is None:
+            # Created on the loop thread, which is the only thread that touches it
+            self._slots = asyncio.Semaphore(self.max_workers)
+        async with self._slots:
+            started = self._started()
+            attempts = 0
+            error = None
+            text = self.default
+            try:
+                while True:
+                    if self._bucket is not None:
+                        await self._bucket.acquire_async()
+                    attempts += 1
+                    try:
+                        text = await fn(item)
+                        error = None
+                        break
+                    except Exception as e:
+                        error = e
+                        if not self._should_retry(e, attempts, start_time):
+                            break
+                        await asyncio.sleep(self._backoff(attempts - 1))
+            finally:
+                result = self._finished(text, item, start_time, started, attempts, error)
+            return result
+
+    def submit(self, fn, item, start_time):
+        # Returns a concurrent.futures.Future, so map() works unchanged
+        self._pending.acquire()
+        try:
+            return asyncio.run_coroutine_threadsafe(self._run_async(fn, item, start_time), event_loop())
+        except Exception:
+            self._pending.release()
+            raise
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def event_loop():
+    # One background loop per process for every async provider call
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="asr-event-loop", daemon=True).start()
+        return _loop
+
+
+def async_transcription_enabled():
+    return os.getenv("TRANSCRIBE_ASYNC", "1").lower() not in ("0", "false", "no")
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 4)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_chunk_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            scheduler_class = AsyncChunkScheduler if async_transcription_enabled() else ChunkScheduler
+            _scheduler = scheduler_class(
+                max_workers=int(os.getenv("TRANSCRIBE_CONCURRENCY", "4")),
+                requests_per_minute=float(os.getenv("TRANSCRIBE_REQUESTS_PER_MINUTE", "50")),
+                max_retries=int(os.getenv("TRANSCRIBE_MAX_RETRIES", "3")),
+                backoff_seconds=float(os.getenv("TRANSCRIBE_BACKOFF_SECONDS", "1.0")),
+            )
+        return _scheduler
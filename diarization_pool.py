@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+WARMUP_SAMPLE_RATE = 16000
+
+
+class DiarizationPool:
+    # Holds up to `size` loaded pyannote pipelines. Instances are created lazily
+    # on first checkout and handed back to the idle queue after every request,
+    # so concurrent workers never share (or reload) a pipeline.
+
+    def __init__(self, model_name=DIARIZATION_MODEL, auth_token=None, size=1):
+        self.model_name = model_name
+        self.auth_token = auth_token
+        self.size = max(1, int(size))
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._load_count = 0
+        self._load_seconds = 0.0
+        self._last_load_seconds = None
+        self._inference_count = 0
+        self._inference_seconds = 0.0
+        self._last_inference_seconds = None
+        self._max_inference_seconds = 0.0
+
+    def _load_pipeline(self):
+        from pyannote.audio import Pipeline
+
+        started = time.perf_counter()
+        pipeline = Pipeline.from_pretrained(self.model_name, use_auth_token=self.auth_token)
+        if pipeline is None:
+            raise RuntimeError("Failed to load the diarization model.")
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._load_count += 1
+            self._load_seconds += elapsed
+            self._last_load_seconds = elapsed
+        print(f"Loaded {self.model_name} in {elapsed:.2f}s ({self._created}/{self.size} instances)")
+        return pipeline
+
+    def _checkout(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            should_load = self._created < self.size
+            if should_load:
+                self._created += 1
+        if should_load:
+            try:
+                return self._load_pipeline()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    def _checkin(self, pipeline):
+        self._idle.put(pipeline)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        pipeline = self._checkout(timeout)
+        try:
+            yield pipeline
+        finally:
+            self._checkin(pipeline)
+
+    def diarize(self, audio, **kwargs):
+        with self.acquire() as pipeline:
+            started = time.perf_counter()
+            result = pipeline(audio, **kwargs)
+            elapsed = time.perf_counter() - started
+        with self._lock:
+            self._inference_count += 1
+            self._inference_seconds += elapsed
+            self._last_inference_seconds = elapsed
+            self._max_inference_seconds = max(self._max_inference_seconds, elapsed)
+        return result
+
+    def warm_up(self, instances=None, duration=2.0):
+        # Load every instance up front and push a short silent clip through each,
+        # so the first real request doesn't pay for model load and lazy CUDA/BLAS init.
+        import torch
+
+        count = self.size if instances is None else max(1, min(int(instances), self.size))
+        waveform = torch.zeros(1, int(WARMUP_SAMPLE_RATE * duration))
+        pipelines = []
+        started = time.perf_counter()
+        try:
+            for _ in range(count):
+                pipelines.append(self._checkout())
+            for pipeline in pipelines:
+                pipeline({'waveform': waveform, 'sample_rate': WARMUP_SAMPLE_RATE})
+        finally:
+            for pipeline in pipelines:
+                self._checkin(pipeline)
+        elapsed = time.perf_counter() - started
+        print(f"Diarization warm-up finished for {len(pipelines)} instance(s) in {elapsed:.2f}s")
+        return elapsed
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "pool_size": self.size,
+                "instances_loaded": self._created,
+                "instances_idle": self._idle.qsize(),
+                "load_count": self._load_count,
+                "load_seconds_total": round(self._load_seconds, 4),
+                "last_load_seconds": self._last_load_seconds,
+                "inference_count": self._inference_count,
+                "inference_seconds_total": round(self._inference_seconds, 4),
+                "inference_seconds_avg": (
+                    round(self._inference_seconds / self._inference_count, 4) if self._inference_count else None
+                ),
+                "last_inference_seconds": self._last_inference_seconds,
+                "max_inference_seconds": round(self._max_inference_seconds, 4),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_diarization_pool(auth_token=None, size=None, model_name=DIARIZATION_MODEL):
+    key = (model_name, auth_token)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if size is None:
+                size = int(os.getenv("DIARIZATION_POOL_SIZE", "1"))
+            pool = DiarizationPool(model_name=model_name, auth_token=auth_token, size=size)
+            _pools[key] = pool
+        return pool
+
+
+def warm_up_from_env(auth_token=None):
+    if os.getenv("DIARIZATION_WARMUP", "0").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        return get_diarization_pool(auth_token=auth_token).warm_up()
+    except Exception as e:
+        print(f"Diarization warm-up failed: {e}")
+        return None
@@ -0,0 +1,69 @@
+import os
+import threading
+
+# recognize() rejects inline audio longer than about a minute; longer chunks use long_running_recognize()
+SYNC_RECOGNIZE_SECONDS = 55.0
+
+
+def speech_module():
+    from google.cloud import speech_v1p1beta1 as speech
+
+    return speech
+
+
+def credentials_from_env():
+    # A service-account key file; when unset the client uses application default credentials
+    path = os.getenv("GOOGLE_SPEECH_CREDENTIALS")
+    if not path:
+        return None
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_file(path)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_speech_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = speech_module().SpeechClient(credentials=credentials_from_env())
+        return _client
+
+
+def create_async_speech_client():
+    # grpc.aio channels are bound to the event loop they are created on
+    return speech_module().SpeechAsyncClient(credentials=credentials_from_env())
+
+
+def recognition_config(sample_rate, language_code, word_timestamps=False, speaker_count=None, encoding="LINEAR16"):
+    speech = speech_module()
+    options = {
+        "encoding": getattr(speech.RecognitionConfig.AudioEncoding, encoding),
+        "sample_rate_hertz": sample_rate,
+        "language_code": language_code,
+        "enable_automatic_punctuation": True,
+        "enable_word_time_offsets": word_timestamps,
+    }
+    if speaker_count:
+        options["diarization_config"] = speech.SpeakerDiarizationConfig(
+            enable_speaker_diarization=True, max_speaker_count=speaker_count
+        )
+    return speech.RecognitionConfig(**options)
+
+
+def response_segments(response, word_timestamps=False):
+    # (start, end, text, words) per result, the shape asr_backends.timed_response takes
+    segments = []
+    for result in response.results:
+        if not result.alternatives:
+            continue
+        alternative = result.alternatives[0]
+        words = [{"word": word.word, "start": word.start_time.total_seconds(), "end": word.end_time.total_seconds()}
+                 for word in alternative.words]
+        start = words[0]["start"] if words else 0.0
+        end = words[-1]["end"] if words else 0.0
+        segments.append((start, end, alternative.transcript, words if word_timestamps else []))
+    return segments
@@ -0,0 +1,216 @@
+import io
+import itertools
+import os
+import uuid
+from collections import namedtuple
+
+from audio_array import WAVE_FORMAT_EXTENSIBLE, WAVE_FORMAT_PCM, riff_layout
+from google_speech import get_speech_client, recognition_config, speech_module
+from ingest import MAX_AUDIO_BYTES, AudioTooLarge, ingest_chunks, read_stream
+from sentence_segmenter import SentenceSegmenter
+
+WAVE_FORMAT_MULAW = 0x0007
+# Any WAV header worth streaming fits in this much of the file
+HEADER_PROBE_BYTES = 64 * 1024
+# Google ends a streaming session after about five minutes of audio, so longer
+# recordings are sent as consecutive sessions
+STREAM_SESSION_SECONDS = float(os.getenv("GOOGLE_STREAM_SESSION_SECONDS", "280"))
+# Google recommends about 100 ms of audio per streaming request
+REQUEST_SECONDS = 0.1
+
+StreamFormat = namedtuple("StreamFormat", ["encoding", "sample_rate", "bytes_per_second"])
+
+
+def stream_format(fmt):
+    # Mono 16-bit PCM and 8-bit mu-law (telephony) WAVs go to Google as they are
+    if fmt is None or fmt["channels"] != 1:
+        return None
+    if fmt["format_tag"] in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) and fmt["bits"] == 16:
+        return StreamFormat("LINEAR16", fmt["sample_rate"], fmt["sample_rate"] * 2)
+    if fmt["format_tag"] == WAVE_FORMAT_MULAW and fmt["bits"] == 8:
+        return StreamFormat("MULAW", fmt["sample_rate"], fmt["sample_rate"])
+    return None
+
+
+def probe_wav_header(chunks):
+    # Reads only as far as the start of the data chunk. Returns (layout or None,
+    # bytes read so far); the caller continues with the same iterator.
+    prefix = b''
+    for chunk in chunks:
+        prefix += chunk
+        if len(prefix) >= 12 and (prefix[:4] != b'RIFF' or prefix[8:12] != b'WAVE'):
+            return None, prefix
+        layout = riff_layout(io.BytesIO(prefix))
+        if layout is not None or len(prefix) >= HEADER_PROBE_BYTES:
+            return layout, prefix
+    return None, prefix
+
+
+def capped(chunks, max_bytes):
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise AudioTooLarge(f"Audio exceeds the {max_bytes} byte limit")
+        yield chunk
+
+
+def limited(chunks, size):
+    # Stops at the declared end of the data chunk (a LIST chunk may follow it)
+    for chunk in chunks:
+        if size <= 0:
+            return
+        yield chunk[:size]
+        size -= len(chunk)
+
+
+def frames(chunks, frame_bytes):
+    # Re-cuts the byte stream into fixed-size request frames; the last may be short
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= frame_bytes:
+            yield bytes(buffer[:frame_bytes])
+            del buffer[:frame_bytes]
+    if buffer:
+        yield bytes(buffer)
+
+
+class GoogleStreamingRecognizer:
+    # Streams a recording to Google's streaming_recognize while it is still
+    # arriving. events() yields dicts as results come back:
+    #     {"type": "interim", "text", "stability"}   not final, may still change
+    #     {"type": "sentence", "speaker", "sentence", "start", "end"}
+    #     {"type": "done", "transcription": ["Speaker N: ...", ...], ...}
+    # Speaker tags come from Google's diarization; they are numbered by first
+    # appearance and are not guaranteed to match across five-minute sessions.
+    # Google only tags words in a cumulative final result (every word of the
+    # session so far), usually the last one of a session. Untagged final words
+    # wait for it, so sentences follow the tags rather than the per-utterance
+    # finals; interim events still arrive live.
+
+    def __init__(self, client=None, language_code="en-US", speaker_count=6, interim_results=True,
+                 session_seconds=STREAM_SESSION_SECONDS, max_bytes=MAX_AUDIO_BYTES, work_dir="tmp"):
+        self.client = client
+        self.language_code = language_code
+        self.speaker_count = speaker_count
+        self.interim_results = interim_results
+        self.session_seconds = session_seconds
+        self.max_bytes = max_bytes
+        self.work_dir = work_dir
+        self.format = None
+        self.audio_seconds = 0.0
+        self.sessions = 0
+
+    def _audio_stream(self, chunks):
+        # Returns (StreamFormat, audio byte iterator, cleanup path or None)
+        chunks = iter(capped(chunks, self.max_bytes))
+        layout, prefix = probe_wav_header(chunks)
+        stream = stream_format(layout[0]) if layout is not None else None
+        if stream is not None:
+            fmt, offset, size = layout
+            audio = itertools.chain([prefix[offset:]], chunks)
+            if 0 < size < 0xFFFFFFFF:
+                audio = limited(audio, size)
+            return stream, audio, None
+
+        # Anything else (MP3, stereo, 24-bit...) is transcoded to 16 kHz mono PCM first,
+        # which means waiting for the whole file
+        path = os.path.join(self.work_dir, f"google_stream_{uuid.uuid4().hex[:12]}.wav")
+        ingested = ingest_chunks(itertools.chain([prefix], chunks), path, self.max_bytes)
+        with open(ingested.path, 'rb') as wav_file:
+            fmt, offset, size = riff_layout(wav_file)
+        audio_file = open(ingested.path, 'rb')
+        audio_file.seek(offset)
+        return stream_format(fmt), read_stream(audio_file), (audio_file, ingested.path)
+
+    def _streaming_config(self, stream):
+        speech = speech_module()
+        config = recognition_config(stream.sample_rate, self.language_code, word_timestamps=True,
+                                    speaker_count=self.speaker_count, encoding=stream.encoding)
+        return speech.StreamingRecognitionConfig(config=config, interim_results=self.interim_results)
+
+    def events(self, chunks):
+        stream, audio, cleanup = self._audio_stream(chunks)
+        try:
+            yield from self._recognize(stream, audio)
+        finally:
+            if cleanup is not None:
+                audio_file, path = cleanup
+                audio_file.close()
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _recognize(self, stream, audio):
+        speech = speech_module()
+        client = self.client or get_speech_client()
+        streaming_config = self._streaming_config(stream)
+        self.format = stream
+        frame_bytes = max(2, int(stream.bytes_per_second * REQUEST_SECONDS) // 2 * 2)
+        frames_per_session = max(1, int(self.session_seconds / REQUEST_SECONDS))
+        pending = frames(audio, frame_bytes)
+        segmenter = SentenceSegmenter()
+        labels = {}
+        lines = []
+
+        def sentence_event(sentence):
+            lines.append(f"{sentence.speaker}: {sentence.text}")
+            return {"type": "sentence", "speaker": sentence.speaker, "sentence": sentence.text,
+                    "start": round(sentence.start, 2), "end": round(sentence.end, 2)}
+
+        while True:
+            first = next(pending, None)
+            if first is None:
+                break
+            session = itertools.chain([first], itertools.islice(pending, frames_per_session - 1))
+            sent = [0]
+
+            def requests(session=session, sent=sent):
+                # Pulled by the gRPC client as it sends, so a slow download simply paces the stream
+                for frame in session:
+                    sent[0] += len(frame)
+                    yield speech.StreamingRecognizeRequest(audio_content=frame)
+
+            offset = self.audio_seconds
+            self.sessions += 1
+            # Cumulative results repeat earlier words; only words past these ends are taken
+            heard_until = 0.0
+            untagged = []
+            untagged_until = 0.0
+            for response in client.streaming_recognize(config=streaming_config, requests=requests()):
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    alternative = result.alternatives[0]
+                    if not result.is_final:
+                        yield {"type": "interim", "text": alternative.transcript,
+                               "stability": round(float(result.stability), 3)}
+                        continue
+                    if not any(word.speaker_tag for word in alternative.words):
+                        for word in alternative.words:
+                            if word.end_time.total_seconds() > untagged_until:
+                                untagged_until = word.end_time.total_seconds()
+                                untagged.append(word)
+                        continue
+                    for word in alternative.words:
+                        start, end = word.start_time.total_seconds(), word.end_time.total_seconds()
+                        if end <= heard_until:
+                            continue
+                        heard_until = end
+                        label = labels.setdefault(word.speaker_tag, f"Speaker {len(labels) + 1}")
+                        for sentence in segmenter.feed(label, word.word, offset + start, offset + end):
+                            yield sentence_event(sentence)
+                    untagged = [word for word in untagged if word.end_time.total_seconds() > heard_until]
+            # Words Google never tagged (a session cut before its cumulative result) stay with the last speaker
+            for word in untagged:
+                label = segmenter.speaker or labels.setdefault(0, f"Speaker {len(labels) + 1}")
+                for sentence in segmenter.feed(label, word.word, offset + word.start_time.total_seconds(),
+                                               offset + word.end_time.total_seconds()):
+                    yield sentence_event(sentence)
+            self.audio_seconds = offset + sent[0] / float(stream.bytes_per_second)
+
+        for sentence in segmenter.flush():
+            yield sentence_event(sentence)
+        yield {"type": "done", "transcription": lines, "encoding": stream.encoding,
+               "sample_rate": stream.sample_rate, "audio_seconds": round(self.audio_seconds, 2),
+               "sessions": self.sessions}
@@ -0,0 +1,28 @@
+import os
+
+# gunicorn -c gunicorn.conf.py app:app
+
+bind = os.getenv("BIND", "0.0.0.0:8962")
+# Threaded sync workers: each request holds a thread, so long /transcribe calls,
+# /jobs/<id>/stream and /transcribe/batch streams don't block /jobs polling or /metrics
+worker_class = "gthread"
+
+# Every worker holds its own pyannote pipelines and diarization runs torch on
+# all cores, so a few large workers with many threads beat one per core
+_cpus = os.cpu_count() or 1
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, min(4, _cpus // 4)))))
+# Workers size their /transcribe/batch diarization pools from this
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# Long recordings take minutes; streamed responses (/jobs/<id>/stream, /transcribe/batch) longer
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "900"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "120"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then so fragmentation from large audio buffers can't build up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "500"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "50"))
+
+# Shares PRELOAD_MODELS between workers; leave it off if diarization is preloaded (see Readme)
+preload_app = os.getenv("GUNICORN_PRELOAD", "0").lower() in ("1", "true", "yes")
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import wave
+from collections import namedtuple
+from tempfile import NamedTemporaryFile
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_SAMPLE_WIDTH = 2
+STREAM_CHUNK_SIZE = 64 * 1024
+
+MAX_AUDIO_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(500 * 1024 * 1024)))
+CONNECT_TIMEOUT = float(os.getenv("INGEST_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("INGEST_READ_TIMEOUT", "60"))
+
+# sha256 and size_bytes describe the bytes as received, before any transcoding
+IngestedAudio = namedtuple("IngestedAudio", ["path", "sha256", "size_bytes", "transcoded"])
+
+
+class IngestError(Exception):
+    pass
+
+
+class AudioTooLarge(IngestError):
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    # One pooled session per process so repeated downloads from the same
+    # storage host reuse keep-alive connections.
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _spool(chunks, destination_path, max_bytes):
+    # Writes the byte stream next to its destination, hashing as it goes, and
+    # aborts as soon as the cap is crossed so oversized inputs never fill the disk.
+    directory = os.path.dirname(os.path.abspath(destination_path))
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with NamedTemporaryFile(dir=directory, suffix=".part", delete=False) as spool_file:
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AudioTooLarge(f"Audio exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                spool_file.write(chunk)
+        except BaseException:
+            spool_file.close()
+            os.remove(spool_file.name)
+            raise
+    return spool_file.name, digest.hexdigest(), size
+
+
+def read_stream(stream):
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def is_target_pcm_wav(path):
+    try:
+        with wave.open(path, 'rb') as wav_file:
+            return (wav_file.getnchannels() == TARGET_CHANNELS
+                    and wav_file.getframerate() == TARGET_SAMPLE_RATE
+                    and wav_file.getsampwidth() == TARGET_SAMPLE_WIDTH
+                    and wav_file.getcomptype() == 'NONE')
+    except (wave.Error, EOFError):
+        return False
+
+
+def transcode_to_pcm_wav(source_path, destination_path):
+    # ffmpeg streams from file to file, so long inputs are never decoded into
+    # Python memory. Without ffmpeg only WAV inputs can be converted.
+    if shutil.which("ffmpeg"):
+        command = [
+            "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y", "-i", source_path,
+            "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-acodec", "pcm_s16le",
+            "-f", "wav", destination_path,
+        ]
+        result = subprocess.run(command, capture_output=True)
+        if result.returncode != 0:
+            raise IngestError(f"Could not decode audio: {result.stderr.decode(errors='replace').strip()}")
+        return destination_path
+
+    from pydub import AudioSegment
+
+    try:
+        audio = AudioSegment.from_wav(source_path)
+    except Exception as e:
+        raise IngestError(f"Could not decode audio (ffmpeg is not installed): {e}")
+    audio = audio.set_channels(TARGET_CHANNELS).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(TARGET_SAMPLE_WIDTH)
+    audio.export(destination_path, format="wav")
+    return destination_path
+
+
+def _finish(spool_path, digest, size, destination_path, transcode):
+    if not transcode or is_target_pcm_wav(spool_path):
+        os.replace(spool_path, destination_path)
+        return IngestedAudio(destination_path, digest, size, False)
+    try:
+        transcode_to_pcm_wav(spool_path, destination_path)
+    except BaseException:
+        # ffmpeg may have written part of the output before failing
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
+        raise
+    finally:
+        os.remove(spool_path)
+    return IngestedAudio(destination_path, digest, size, True)
+
+
+def open_url_stream(url, max_bytes=MAX_AUDIO_BYTES):
+    # A streaming response from the pooled session; the caller iterates it and closes it
+    response = get_http_session().get(url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    try:
+        response.raise_for_status()
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise AudioTooLarge(f"Audio exceeds the {max_bytes} byte limit")
+    except BaseException:
+        response.close()
+        raise
+    return response
+
+
+def ingest_chunks(chunks, destination_path, max_bytes=MAX_AUDIO_BYTES, transcode=True):
+    spool_path, digest, size = _spool(chunks, destination_path, max_bytes)
+    return _finish(spool_path, digest, size, destination_path, transcode)
+
+
+def ingest_url(url, destination_path, max_bytes=MAX_AUDIO_BYTES, transcode=True):
+    with open_url_stream(url, max_bytes) as response:
+        spool_path, digest, size = _spool(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), destination_path, max_bytes)
+    return _finish(spool_path, digest, size, destination_path, transcode)
+
+
+def ingest_upload(file_storage, destination_path, max_bytes=MAX_AUDIO_BYTES, transcode=True):
+    return ingest_chunks(read_stream(file_storage.stream), destination_path, max_bytes, transcode)
@@ -0,0 +1,260 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED_STATUSES = (COMPLETED, FAILED)
+
+
+class JobStore:
+    # SQLite-backed job state. Every gunicorn worker opens the same file, so
+    # any worker can answer GET /jobs/<id> or stream a job another one runs,
+    # and queued/running jobs are still on disk after a restart.
+
+    def __init__(self, path="tmp/jobs.sqlite3"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL, "
+                "chunks_done INTEGER NOT NULL DEFAULT 0, chunks_total INTEGER, "
+                "source TEXT NOT NULL, error TEXT, result TEXT, owner TEXT, heartbeat REAL, "
+                "created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS job_lines ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, line TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def create(self, source, owner):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, stage, source, owner, heartbeat, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, json.dumps(source), owner, now, now, now),
+            )
+        return job_id
+
+    def heartbeat(self, owner):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status NOT IN (?, ?)",
+                (time.time(), owner, *FINISHED_STATUSES),
+            )
+
+    def claim(self, job_id, owner, stale_before):
+        # Compare-and-swap on the heartbeat: of several workers recovering at
+        # once only one takes the job, and jobs a live worker still owns are left alone.
+        with self._connect() as connection:
+            claimed = connection.execute(
+                "UPDATE jobs SET owner = ?, heartbeat = ? "
+                "WHERE id = ? AND status NOT IN (?, ?) AND (heartbeat IS NULL OR heartbeat < ?)",
+                (owner, time.time(), job_id, *FINISHED_STATUSES, stale_before),
+            ).rowcount
+        return claimed == 1
+
+    def update(self, job_id, **fields):
+        if "source" in fields:
+            fields["source"] = json.dumps(fields["source"])
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def append_line(self, job_id, seq, line):
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO job_lines (job_id, seq, line) VALUES (?, ?, ?)",
+                               (job_id, seq, line))
+
+    def clear_lines(self, job_id):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM job_lines WHERE job_id = ?", (job_id,))
+
+    def lines(self, job_id, after=-1):
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT seq, line FROM job_lines WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [(row["seq"], row["line"]) for row in rows]
+
+    def get(self, job_id):
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["source"] = json.loads(job["source"])
+        job["result"] = json.loads(job["result"], object_pairs_hook=OrderedDict) if job["result"] else None
+        return job
+
+    def unfinished(self):
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id FROM jobs WHERE status NOT IN (?, ?) ORDER BY created", FINISHED_STATUSES
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class JobProgress:
+    # Handed to the job runner so pipeline stages can report without knowing about the store.
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self._seq = 0
+
+    def stage(self, stage, **fields):
+        self.store.update(self.job_id, stage=stage, **fields)
+
+    def chunks(self, done, total):
+        self.store.update(self.job_id, chunks_done=done, chunks_total=total)
+
+    def line(self, line):
+        self.store.append_line(self.job_id, self._seq, line)
+        self._seq += 1
+
+
+class NullProgress:
+    # Used when the pipeline runs inline for a plain /transcribe request.
+
+    def stage(self, stage, **fields):
+        pass
+
+    def chunks(self, done, total):
+        pass
+
+    def line(self, line):
+        pass
+
+
+class JobManager:
+
+    def __init__(self, store, runner, max_workers=2, heartbeat_seconds=10.0, can_resume=None):
+        self.store = store
+        self.runner = runner
+        self.can_resume = can_resume
+        self.owner = uuid.uuid4().hex
+        self.heartbeat_seconds = heartbeat_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="job")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                self.store.heartbeat(self.owner)
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+            # A worker that died shortly before this process started still looked
+            # alive at startup; its jobs are picked up once its heartbeat goes stale
+            if self.can_resume is not None:
+                try:
+                    resumed = self.recover(self.can_resume)
+                    if resumed:
+                        print(f"Resumed {resumed} unfinished transcription job(s)")
+                except Exception as e:
+                    print(f"Job recovery failed: {e}")
+
+    def submit(self, source):
+        job_id = self.store.create(source, self.owner)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        progress = JobProgress(self.store, job_id)
+        self.store.clear_lines(job_id)
+        self.store.update(job_id, status=RUNNING, stage="started", chunks_done=0, error=None)
+        try:
+            result = self.runner(job["source"], progress)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.update(job_id, status=FAILED, stage=FAILED, error=str(e))
+            return
+        self.store.update(job_id, status=COMPLETED, stage=COMPLETED, result=result)
+
+    def recover(self, can_resume):
+        # Re-queue jobs a previous process left unfinished; ones whose input is gone fail fast.
+        resumed = 0
+        stale_before = time.time() - 3 * self.heartbeat_seconds
+        for job_id in self.store.unfinished():
+            if not self.store.claim(job_id, self.owner, stale_before):
+                continue
+            job = self.store.get(job_id)
+            if can_resume(job["source"]):
+                self.store.update(job_id, status=QUEUED, stage=QUEUED)
+                self._executor.submit(self._run, job_id)
+                resumed += 1
+            else:
+                self.store.update(job_id, status=FAILED, stage=FAILED, error="Interrupted by a restart")
+        return resumed
+
+    def stream(self, job_id, poll_seconds=0.5):
+        # Server-sent events: one `line` event per transcript line, `progress`
+        # whenever the stage/counters move, then a final `done` or `error`.
+        last_seq = -1
+        last_progress = None
+        while True:
+            job = self.store.get(job_id)
+            if job is None:
+                yield _sse("error", {"error": "Job not found"})
+                return
+            for seq, line in self.store.lines(job_id, after=last_seq):
+                last_seq = seq
+                yield _sse("line", {"seq": seq, "line": line})
+            progress = job_status(job)
+            progress.pop("result", None)
+            if progress != last_progress:
+                last_progress = progress
+                yield _sse("progress", progress)
+            if job["status"] == COMPLETED:
+                yield _sse("done", job["result"])
+                return
+            if job["status"] == FAILED:
+                yield _sse("error", {"error": job["error"]})
+                return
+            time.sleep(poll_seconds)
+
+
+def job_status(job):
+    return OrderedDict([
+        ("id", job["id"]),
+        ("status", job["status"]),
+        ("stage", job["stage"]),
+        ("chunks_done", job["chunks_done"]),
+        ("chunks_total", job["chunks_total"]),
+        ("error", job["error"]),
+        ("result", job["result"]),
+    ])
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
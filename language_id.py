@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from resources import fasttext_model_path, registry
+
+# Names for the fastText lid.176 codes we report most often
+LANGUAGE_NAMES = {
+    "en": "English", "fr": "French", "hi": "Hindi", "es": "Spanish", "de": "German",
+    "it": "Italian", "pt": "Portuguese", "ru": "Russian", "zh": "Chinese", "ja": "Japanese",
+    "ko": "Korean", "ar": "Arabic", "tr": "Turkish", "nl": "Dutch", "el": "Greek",
+    "sv": "Swedish", "pl": "Polish", "he": "Hebrew", "bn": "Bengali", "th": "Thai",
+    "id": "Indonesian", "vi": "Vietnamese", "ro": "Romanian", "fa": "Persian", "uk": "Ukrainian",
+    "ur": "Urdu", "ta": "Tamil", "te": "Telugu", "ms": "Malay", "hu": "Hungarian"
+}
+
+LanguagePrediction = namedtuple("LanguagePrediction", ["code", "confidence"])
+
+
+def language_name(code):
+    return LANGUAGE_NAMES.get(code, 'Unknown Language')
+
+
+def language_label(code):
+    # The "Name (code)" form the /transcribe response has always used
+    return f"{language_name(code)} ({code})" if code else "Unknown Language (empty text)"
+
+
+def prediction_dicts(predictions):
+    return [{"code": p.code, "name": language_name(p.code), "confidence": round(p.confidence, 4)} for p in predictions]
+
+
+def combine(predictions, weights, k):
+    # Top-k languages over several texts: each text's probabilities count in
+    # proportion to its weight (its length), so a long turn outweighs "ok".
+    scores = {}
+    total = 0.0
+    for text_predictions, weight in zip(predictions, weights):
+        if not text_predictions or weight <= 0:
+            continue
+        total += weight
+        for prediction in text_predictions:
+            scores[prediction.code] = scores.get(prediction.code, 0.0) + weight * prediction.confidence
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [LanguagePrediction(code, score / total) for code, score in ranked]
+
+
+class LanguageIdentifier:
+    # fastText language ID over many texts at once. predict() sends every text
+    # it hasn't seen before to the model in one call and caches the top-k
+    # result per text hash, so repeated phrases ("thank you for calling") and
+    # re-runs of the same call never reach the model twice.
+
+    def __init__(self, k=3, cache_size=50000):
+        self.k = max(1, int(k))
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._model_calls = 0
+
+    def config(self):
+        return {"model": os.path.basename(fasttext_model_path()), "top_k": self.k}
+
+    def _key(self, text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def predict(self, texts):
+        # One [LanguagePrediction] list (best first) per text; [] for empty texts
+        cleaned = [" ".join(text.split()) for text in texts]
+        results = [[] for _ in cleaned]
+        missing = OrderedDict()
+        with self._lock:
+            for index, text in enumerate(cleaned):
+                if not text:
+                    continue
+                key = self._key(text)
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self._hits += 1
+                    results[index] = cached
+                else:
+                    missing.setdefault(key, (text, []))[1].append(index)
+            self._misses += len(missing)
+        if not missing:
+            return results
+
+        # fastText takes a list of lines and predicts them in one native call
+        batch = [text for text, _ in missing.values()]
+        labels, probabilities = registry.get("language_id").predict(batch, k=self.k)
+        with self._lock:
+            self._model_calls += 1
+            for (key, (_, indexes)), text_labels, text_probabilities in zip(missing.items(), labels, probabilities):
+                predictions = [LanguagePrediction(label.replace('__label__', ''), float(probability))
+                               for label, probability in zip(text_labels, text_probabilities)]
+                for index in indexes:
+                    results[index] = predictions
+                self._cache[key] = predictions
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def detect(self, text):
+        predictions = self.predict([text])[0]
+        return predictions[0].code if predictions else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "top_k": self.k,
+                "cache_entries": len(self._cache),
+                "cache_hits": self._hits,
+                "cache_misses": self._misses,
+                "model_calls": self._model_calls,
+            }
+
+
+_identifier = None
+_identifier_lock = threading.Lock()
+
+
+def get_language_identifier():
+    global _identifier
+    with _identifier_lock:
+        if _identifier is None:
+            _identifier = LanguageIdentifier(
+                k=int(os.getenv("LANGUAGE_ID_TOP_K", "3")),
+                cache_size=int(os.getenv("LANGUAGE_ID_CACHE_SIZE", "50000")),
+            )
+        return _identifier
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def cache_key(content_hash, config):
+    # Same audio + same pipeline settings -> same key, whatever the file was called
+    payload = json.dumps({"audio": content_hash, "config": config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    # In-process LRU; the local stand-in for a Redis cache when none is configured.
+
+    def __init__(self, max_entries=1000, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_bytes and self._bytes > self.max_bytes)):
+                _, old_value = self._entries.popitem(last=False)
+                self._bytes -= len(old_value)
+                evicted += 1
+        return evicted
+
+    def size(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class DiskCacheBackend:
+    # One JSON file per key; file mtime doubles as the LRU clock.
+
+    def __init__(self, directory="tmp/cache", max_entries=1000, max_bytes=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as cache_file:
+                value = cache_file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as cache_file:
+            cache_file.write(value)
+        os.replace(temp_path, path)
+        return self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def _evict(self):
+        evicted = 0
+        with self._lock:
+            entries = self._entries()
+            total_bytes = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or (self.max_bytes and total_bytes > self.max_bytes)):
+                _, size, name = entries.pop(0)
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+                evicted += 1
+        return evicted
+
+    def size(self):
+        entries = self._entries()
+        return {"entries": len(entries), "bytes": sum(size for _, size, _ in entries)}
+
+
+class SQLiteCacheBackend:
+
+    def __init__(self, path="tmp/result_cache.sqlite3", max_entries=1000, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key):
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key, value):
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            evicted = connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            if self.max_bytes:
+                total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+                for old_key, size in connection.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    connection.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total -= size
+                    evicted += 1
+            return evicted
+
+    def size(self):
+        with self._lock, self._connect() as connection:
+            entries, total = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            return {"entries": entries, "bytes": total}
+
+
+class RedisCacheBackend:
+    # Eviction is left to the server (maxmemory-policy allkeys-lru); entries also expire after `ttl_seconds`.
+
+    def __init__(self, url, ttl_seconds=7 * 24 * 3600, prefix="voxid:result:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl_seconds)
+        return 0
+
+    def size(self):
+        return {"entries": None, "bytes": None}
+
+
+class ResultCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._sets = 0
+        self._evictions = 0
+        self._errors = 0
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Result cache read failed: {e}")
+            value = None
+            with self._lock:
+                self._errors += 1
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if value is None:
+            return None
+        return json.loads(value, object_pairs_hook=OrderedDict)
+
+    def set(self, key, data):
+        try:
+            evicted = self.backend.set(key, json.dumps(data, indent=4))
+        except Exception as e:
+            print(f"Result cache write failed: {e}")
+            with self._lock:
+                self._errors += 1
+            return
+        with self._lock:
+            self._sets += 1
+            self._evictions += evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "backend": type(self.backend).__name__,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+                "sets": self._sets,
+                "evictions": self._evictions,
+                "errors": self._errors,
+            }
+        try:
+            stats.update(self.backend.size())
+        except Exception as e:
+            print(f"Result cache size lookup failed: {e}")
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def build_backend_from_env():
+    backend = os.getenv("RESULT_CACHE_BACKEND", "disk").lower()
+    max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+    max_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES", "0")) or None
+    if backend == "memory":
+        return MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+    if backend == "sqlite":
+        return SQLiteCacheBackend(os.getenv("RESULT_CACHE_PATH", "tmp/result_cache.sqlite3"),
+                                  max_entries=max_entries, max_bytes=max_bytes)
+    if backend == "redis":
+        return RedisCacheBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return DiskCacheBackend(os.getenv("RESULT_CACHE_DIR", "tmp/cache"), max_entries=max_entries, max_bytes=max_bytes)
+
+
+def get_result_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(build_backend_from_env())
+        return _cache
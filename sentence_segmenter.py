@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+SENTENCE_ENDINGS = ('.', '?', '!')
+
+Sentence = namedtuple("Sentence", ["speaker", "text", "start", "end"])
+
+
+class SentenceSegmenter:
+    # Groups a stream of words into per-speaker sentences: a sentence ends at
+    # . ? or ! and whenever the speaker changes. feed() returns the sentences
+    # a word completes, so callers can emit them while words are still coming;
+    # flush() returns the unfinished one at the end.
+
+    def __init__(self):
+        self.speaker = None
+        self._words = []
+        self._start = None
+        self._end = None
+
+    def feed(self, speaker, word, start=None, end=None):
+        completed = []
+        if speaker != self.speaker:
+            if self._words:
+                completed.append(self._close())
+            self.speaker = speaker
+        if not self._words:
+            self._start = start
+        self._words.append(word)
+        self._end = end
+        if word.endswith(SENTENCE_ENDINGS):
+            completed.append(self._close())
+        return completed
+
+    def flush(self):
+        return [self._close()] if self._words else []
+
+    def _close(self):
+        sentence = Sentence(self.speaker, ' '.join(self._words), self._start, self._end)
+        self._words = []
+        self._start = None
+        self._end = None
+        return sentence
@@ -0,0 +1,93 @@
+import os
+import threading
+from functools import lru_cache
+
+SPACY_MODEL = "en_core_web_sm"
+# Only the tokenizer is needed to split words; the statistical components are never loaded
+EXCLUDED_COMPONENTS = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"]
+
+
+def load_lean_nlp(model=SPACY_MODEL):
+    import spacy
+
+    return spacy.load(model, exclude=EXCLUDED_COMPONENTS)
+
+
+class SpellcheckService:
+
+    def __init__(self, nlp, spell, cache_size=100000):
+        self.nlp = nlp
+        self.spell = spell
+        # Verdicts and candidates are per lower-cased word, so repeated words
+        # across requests never hit the dictionary twice
+        self._is_known = lru_cache(maxsize=cache_size)(self._lookup)
+        self._candidates = lru_cache(maxsize=cache_size)(self._lookup_candidates)
+
+    def _lookup(self, word):
+        return word in self.spell
+
+    def _lookup_candidates(self, word):
+        candidates = self.spell.candidates(word) or set()
+        return sorted(candidates)
+
+    def _misspelled(self, doc, with_candidates):
+        misspelled = []
+        for token in doc:
+            if token.is_punct or token.is_space:
+                continue
+            word = token.text.lower()
+            if self._is_known(word):
+                continue
+            entry = {'word': token.text}
+            if with_candidates:
+                entry['candidates'] = self._candidates(word)
+            misspelled.append(entry)
+        return misspelled
+
+    def check(self, text, with_candidates=False):
+        return self._misspelled(self.nlp(text), with_candidates)
+
+    def check_batch(self, texts, with_candidates=False, n_process=1, batch_size=64):
+        docs = self.nlp.pipe(texts, n_process=n_process, batch_size=batch_size)
+        return [self._misspelled(doc, with_candidates) for doc in docs]
+
+    def cache_info(self):
+        verdicts = self._is_known.cache_info()
+        candidates = self._candidates.cache_info()
+        return {
+            "verdict_hits": verdicts.hits,
+            "verdict_misses": verdicts.misses,
+            "verdict_entries": verdicts.currsize,
+            "candidate_hits": candidates.hits,
+            "candidate_misses": candidates.misses,
+            "candidate_entries": candidates.currsize,
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_spellcheck_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            from spellchecker import SpellChecker
+
+            _service = SpellcheckService(
+                load_lean_nlp(),
+                SpellChecker(),
+                cache_size=int(os.getenv("SPELLCHECK_CACHE_SIZE", "100000")),
+            )
+        return _service
+
+
+def max_spellcheck_processes():
+    # nlp.pipe(n_process > 1) forks a new pool per call. Forking a web worker with
+    # request threads and torch loaded is unsafe, so requests stay in-process
+    # unless this is raised for offline use
+    return max(1, min(int(os.getenv("SPELLCHECK_MAX_PROCESSES", "1")), os.cpu_count() or 1))
+
+
+def max_spellcheck_batch_size():
+    return max(1, int(os.getenv("SPELLCHECK_MAX_BATCH_SIZE", "1000")))
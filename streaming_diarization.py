@@ -0,0 +1,132 @@
+import os
+import wave
+
+import numpy as np
+
+from tracing import span
+from turn_packing import Turn
+
+
+def streaming_options_from_env():
+    return {
+        "window_seconds": float(os.getenv("DIARIZATION_WINDOW_SECONDS", "300")),
+        "overlap_seconds": float(os.getenv("DIARIZATION_WINDOW_OVERLAP", "30")),
+        "similarity_threshold": float(os.getenv("SPEAKER_LINK_THRESHOLD", "0.5")),
+    }
+
+
+def use_streaming_diarization(duration):
+    # STREAMING_DIARIZATION=1 always streams, 0 never does; otherwise only
+    # recordings with more than STREAMING_DIARIZATION_MIN_SECONDS of audio are windowed.
+    mode = os.getenv("STREAMING_DIARIZATION", "auto").lower()
+    if mode in ("1", "true", "yes"):
+        return True
+    if mode in ("0", "false", "no"):
+        return False
+    return duration > float(os.getenv("STREAMING_DIARIZATION_MIN_SECONDS", "600"))
+
+
+def audio_duration(file_path):
+    with wave.open(file_path, 'rb') as wav_file:
+        return wav_file.getnframes() / float(wav_file.getframerate())
+
+
+def iter_windows(duration, window_seconds, overlap_seconds):
+    # Yields (start, end, commit_start, commit_end). Each window is diarized in
+    # full, but only turns inside its commit range are handed on; consecutive
+    # commit ranges meet in the middle of the overlap so nothing is emitted twice.
+    step = max(window_seconds - overlap_seconds, 1.0)
+    start = 0.0
+    commit_start = 0.0
+    while True:
+        end = min(start + window_seconds, duration)
+        last = end >= duration
+        commit_end = duration if last else end - overlap_seconds / 2
+        yield start, end, commit_start, commit_end
+        if last:
+            return
+        commit_start = commit_end
+        start += step
+
+
+def embeddings_by_label(labels, embeddings):
+    # pyannote returns one embedding row per label, in diarization.labels() order
+    if embeddings is None:
+        return {}
+    return {label: embeddings[row] for row, label in enumerate(labels) if row < len(embeddings)}
+
+
+class SpeakerLinker:
+    # Keeps one centroid embedding per global speaker and maps each window's
+    # local labels onto them by cosine similarity.
+
+    def __init__(self, similarity_threshold=0.5):
+        self.similarity_threshold = similarity_threshold
+        self._centroids = []
+
+    def _new_speaker(self, embedding):
+        # Speakers pyannote could not embed (NaN rows for very little speech)
+        # get an id of their own but are never linked to later windows.
+        self._centroids.append(embedding)
+        return f"SPEAKER_{len(self._centroids) - 1:02d}"
+
+    def link(self, labels, embeddings):
+        normalized = {}
+        for row, label in enumerate(labels):
+            if embeddings is None or row >= len(embeddings) or not np.all(np.isfinite(embeddings[row])):
+                continue
+            normalized[label] = embeddings[row] / (np.linalg.norm(embeddings[row]) or 1.0)
+
+        candidates = []
+        for label, embedding in normalized.items():
+            for index, centroid in enumerate(self._centroids):
+                if centroid is not None:
+                    similarity = float(np.dot(embedding, centroid / (np.linalg.norm(centroid) or 1.0)))
+                    candidates.append((similarity, label, index))
+
+        # Greedy one-to-one assignment, best matches first
+        mapping = {}
+        taken = set()
+        for similarity, label, index in sorted(candidates, reverse=True):
+            if label in mapping or index in taken or similarity < self.similarity_threshold:
+                continue
+            mapping[label] = f"SPEAKER_{index:02d}"
+            taken.add(index)
+            self._centroids[index] = self._centroids[index] + normalized[label]
+
+        for label in labels:
+            if label not in mapping:
+                mapping[label] = self._new_speaker(normalized.get(label))
+        return mapping
+
+    def embeddings(self):
+        # Current centroid per global speaker id, for the cross-call speaker index
+        return {f"SPEAKER_{index:02d}": centroid for index, centroid in enumerate(self._centroids)
+                if centroid is not None}
+
+
+class StreamingDiarizer:
+
+    def __init__(self, pool, window_seconds=300.0, overlap_seconds=30.0, similarity_threshold=0.5):
+        self.pool = pool
+        self.window_seconds = window_seconds
+        self.overlap_seconds = min(overlap_seconds, window_seconds / 2)
+        self.similarity_threshold = similarity_threshold
+        self.speaker_embeddings = {}
+
+    def iter_turns(self, audio):
+        # Yields one sorted list of finished turns per window of `audio` (an
+        # AudioArray), labelled with speaker ids that stay stable across windows.
+        linker = SpeakerLinker(self.similarity_threshold)
+        for start, end, commit_start, commit_end in iter_windows(audio.duration, self.window_seconds, self.overlap_seconds):
+            with span("diarize_window", audio_seconds=end - start):
+                diarization, embeddings = self.pool.diarize(audio.pipeline_input(start, end), return_embeddings=True)
+            mapping = linker.link(diarization.labels(), embeddings)
+            self.speaker_embeddings = linker.embeddings()
+            turns = []
+            for turn, _, label in diarization.itertracks(yield_label=True):
+                turn_start = max(start + turn.start, commit_start)
+                turn_end = min(start + turn.end, commit_end)
+                if turn_end > turn_start:
+                    turns.append(Turn(turn_start, turn_end, mapping[label]))
+            yield sorted(turns, key=lambda turn: turn.start)
@@ -0,0 +1,263 @@
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+RTF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+METRIC_PREFIX = "voxid"
+
+
+class Span:
+
+    def __init__(self, stage, bytes=0, audio_seconds=0.0):
+        self.stage = stage
+        self.bytes = bytes
+        self.audio_seconds = audio_seconds
+        self.seconds = 0.0
+        self.error = False
+
+
+class Trace:
+    # One per pipeline run. Spans may be recorded from scheduler and
+    # translation worker threads, so everything goes through the lock.
+
+    def __init__(self, name="transcribe"):
+        self.name = name
+        self.audio_seconds = None
+        self.cache_hit = False
+        self._started = time.perf_counter()
+        self._spans = []
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._finished = None
+
+    def record(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def add_count(self, name, amount):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def elapsed(self):
+        return (self._finished or time.perf_counter()) - self._started
+
+    def real_time_factor(self):
+        if not self.audio_seconds:
+            return None
+        return self.elapsed() / self.audio_seconds
+
+    def breakdown(self):
+        # Per-chunk stages run concurrently, so their summed seconds can exceed
+        # the wall-clock total; max_seconds shows the slowest single call.
+        with self._lock:
+            spans = list(self._spans)
+            counts = dict(self._counts)
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(span.stage, {
+                "count": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0, "audio_seconds": 0.0, "errors": 0,
+            })
+            stage["count"] += 1
+            stage["seconds"] += span.seconds
+            stage["max_seconds"] = max(stage["max_seconds"], span.seconds)
+            stage["bytes"] += span.bytes
+            stage["audio_seconds"] += span.audio_seconds
+            stage["errors"] += int(span.error)
+        for stage in stages.values():
+            for field in ("seconds", "max_seconds", "audio_seconds"):
+                stage[field] = round(stage[field], 4)
+        rtf = self.real_time_factor()
+        breakdown = {
+            "total_seconds": round(self.elapsed(), 4),
+            "audio_seconds": round(self.audio_seconds, 3) if self.audio_seconds else None,
+            "real_time_factor": round(rtf, 4) if rtf is not None else None,
+            "stages": stages,
+        }
+        if counts:
+            breakdown["counts"] = {name: round(value, 4) for name, value in counts.items()}
+        return breakdown
+
+    def finish(self, outcome="ok"):
+        if self._finished is not None:
+            return
+        self._finished = time.perf_counter()
+        if self.cache_hit and outcome == "ok":
+            outcome = "cached"
+        # Only full runs feed the real-time factor; cache hits and failures would skew it
+        metrics.observe_run(self.name, outcome, self.elapsed(), self.audio_seconds if outcome == "ok" else None)
+        if os.getenv("TRACE_LOG", "0").lower() in ("1", "true", "yes"):
+            stages = self.breakdown()["stages"]
+            summary = ", ".join(f"{name}={stage['seconds']:.2f}s" for name, stage in stages.items())
+            print(f"{self.name} {outcome} in {self.elapsed():.2f}s (RTF {self.real_time_factor()}): {summary}")
+
+
+_local = threading.local()
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def activate(trace):
+    # Makes `trace` the one span() records into on this thread
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def span(stage, bytes=0, audio_seconds=0.0, trace=None):
+    # Fields can also be filled in inside the block once they are known:
+    #     with span("decode") as s: ...; s.audio_seconds = len(audio) / 1000
+    current = Span(stage, bytes, audio_seconds)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.error = True
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        metrics.observe_span(current)
+        trace = trace or current_trace()
+        if trace is not None:
+            trace.record(current)
+
+
+def count(name, amount=1, trace=None):
+    # Adds to a process-wide counter (exported as voxid_<name>_total) and to the current trace
+    metrics.observe_count(name, amount)
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add_count(name, amount)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # Process-local aggregates in Prometheus text format. Under gunicorn each
+    # worker exports its own numbers; scrape every worker or sum them upstream.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stage_seconds = {}
+        self._stage_bytes = {}
+        self._stage_audio_seconds = {}
+        self._stage_errors = {}
+        self._runs = {}
+        self._run_seconds = {}
+        self._run_rtf = {}
+        self._run_audio_seconds = {}
+        self._counts = {}
+        self._collectors = []
+
+    def observe_span(self, span):
+        with self._lock:
+            self._stage_seconds.setdefault(span.stage, Histogram(DURATION_BUCKETS)).observe(span.seconds)
+            self._stage_bytes[span.stage] = self._stage_bytes.get(span.stage, 0) + span.bytes
+            self._stage_audio_seconds[span.stage] = self._stage_audio_seconds.get(span.stage, 0.0) + span.audio_seconds
+            self._stage_errors[span.stage] = self._stage_errors.get(span.stage, 0) + int(span.error)
+
+    def observe_count(self, name, amount):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def observe_run(self, name, outcome, seconds, audio_seconds):
+        with self._lock:
+            self._runs[(name, outcome)] = self._runs.get((name, outcome), 0) + 1
+            self._run_seconds.setdefault(name, Histogram(DURATION_BUCKETS)).observe(seconds)
+            if audio_seconds:
+                self._run_rtf.setdefault(name, Histogram(RTF_BUCKETS)).observe(seconds / audio_seconds)
+                self._run_audio_seconds[name] = self._run_audio_seconds.get(name, 0.0) + audio_seconds
+
+    def register_collector(self, subsystem, collect):
+        # `collect` returns a stats dict; its numeric values are exported as gauges
+        self._collectors.append((subsystem, collect))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            _histogram(lines, "stage_duration_seconds", "Time spent per pipeline stage.", "stage", self._stage_seconds)
+            _counter(lines, "stage_bytes_total", "Bytes processed per pipeline stage.", "stage", self._stage_bytes)
+            _counter(lines, "stage_audio_seconds_total", "Audio seconds processed per pipeline stage.", "stage",
+                     self._stage_audio_seconds)
+            _counter(lines, "stage_errors_total", "Pipeline stage failures.", "stage", self._stage_errors)
+            _header(lines, "runs_total", "counter", "Finished pipeline runs by outcome.")
+            for (name, outcome), value in sorted(self._runs.items()):
+                lines.append(f'{METRIC_PREFIX}_runs_total{{pipeline="{name}",outcome="{outcome}"}} {value}')
+            _histogram(lines, "run_duration_seconds", "End-to-end pipeline run time.", "pipeline", self._run_seconds)
+            _histogram(lines, "real_time_factor", "Processing seconds per second of audio.", "pipeline", self._run_rtf)
+            _counter(lines, "audio_seconds_total", "Audio seconds run through the pipeline.", "pipeline",
+                     self._run_audio_seconds)
+            for name, value in sorted(self._counts.items()):
+                _header(lines, f"{name}_total", "counter", f"Total {name.replace('_', ' ')}.")
+                lines.append(f"{METRIC_PREFIX}_{name}_total {_number(value)}")
+        for subsystem, collect in self._collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"Metrics collector {subsystem} failed: {e}")
+                continue
+            for key, value in sorted(stats.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{subsystem}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}"
+                _header(lines, name, "gauge", f"{subsystem} {key}.")
+                lines.append(f"{METRIC_PREFIX}_{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _header(lines, name, kind, help_text):
+    lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+    lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+def _counter(lines, name, help_text, label, values):
+    _header(lines, name, "counter", help_text)
+    for key, value in sorted(values.items()):
+        lines.append(f'{METRIC_PREFIX}_{name}{{{label}="{key}"}} {_number(value)}')
+
+
+def _histogram(lines, name, help_text, label, histograms):
+    _header(lines, name, "histogram", help_text)
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+            cumulative += count
+            lines.append(f'{METRIC_PREFIX}_{name}_bucket{{{label}="{key}",le="{_number(float(bound))}"}} {cumulative}')
+        lines.append(f'{METRIC_PREFIX}_{name}_sum{{{label}="{key}"}} {_number(histogram.sum)}')
+        lines.append(f'{METRIC_PREFIX}_{name}_count{{{label}="{key}"}} {histogram.count}')
+
+
+metrics = Metrics()
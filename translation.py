@@ -0,0 +1,234 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+LANGUAGE_NAMES = {"en": "English"}
+# fastText (ISO 639-1) codes that Google Translate spells differently
+GOOGLE_LANGUAGE_CODES = {"zh": "zh-CN", "he": "iw", "jv": "jw"}
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for the languages we see; good enough for budgeting
+    return max(1, len(text) // 4)
+
+
+def split_segments(lines, max_tokens, max_chars=None):
+    # Packs whole turns (lines) into segments under the budget. A single turn
+    # that is too long on its own is split on sentence, then word, boundaries.
+    segments = []
+    current = []
+    current_tokens = 0
+    current_chars = 0
+
+    def fits(tokens, chars):
+        return current_tokens + tokens <= max_tokens and (max_chars is None or current_chars + chars <= max_chars)
+
+    for line in _bounded_pieces(lines, max_tokens, max_chars):
+        tokens = estimate_tokens(line)
+        chars = len(line) + 1
+        if current and not fits(tokens, chars):
+            segments.append("\n".join(current))
+            current, current_tokens, current_chars = [], 0, 0
+        current.append(line)
+        current_tokens += tokens
+        current_chars += chars
+    if current:
+        segments.append("\n".join(current))
+    return segments
+
+
+def _bounded_pieces(lines, max_tokens, max_chars):
+    def too_big(text):
+        return estimate_tokens(text) > max_tokens or (max_chars is not None and len(text) > max_chars)
+
+    for line in lines:
+        if not too_big(line):
+            yield line
+            continue
+        piece = ""
+        for unit in _split_units(line, too_big):
+            candidate = f"{piece} {unit}".strip()
+            if piece and too_big(candidate):
+                yield piece
+                piece = unit
+            else:
+                piece = candidate
+        if piece:
+            yield piece
+
+
+def _split_units(line, too_big):
+    for sentence in SENTENCE_BOUNDARY.split(line):
+        if too_big(sentence):
+            yield from sentence.split()
+        else:
+            yield sentence
+
+
+class OpenAITranslationBackend:
+    name = "openai"
+    max_segment_tokens = 1500
+    max_segment_chars = None
+
+    def __init__(self, model="gpt-4o"):
+        self.model = model
+
+    def translate(self, text, source, target):
+        target_name = LANGUAGE_NAMES.get(target, target)
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant who translates text. "
+                                              "Keep line breaks and any 'MM:SS Caller N:' prefixes unchanged."},
+                {"role": "user", "content": f"Translate the following text to {target_name}:\n\n{text}"}
+            ],
+            # Sized to the segment so long calls are never silently truncated
+            max_tokens=min(4096, 2 * estimate_tokens(text) + 256),
+            temperature=0.1
+        )
+        return response['choices'][0]['message']['content'].strip()
+
+
+class GoogleTranslationBackend:
+    name = "google"
+    max_segment_tokens = 1200
+    max_segment_chars = 4500  # deep_translator rejects payloads over 5000 characters
+
+    def __init__(self):
+        # GoogleTranslator keeps the query in instance state, so each thread gets its own
+        self._local = threading.local()
+
+    def _translator(self, source, target):
+        from deep_translator import GoogleTranslator
+
+        translators = getattr(self._local, "translators", None)
+        if translators is None:
+            translators = self._local.translators = {}
+        translator = translators.get((source, target))
+        if translator is None:
+            translator = translators[(source, target)] = GoogleTranslator(source=source, target=target)
+        return translator
+
+    def translate(self, text, source, target):
+        from deep_translator.exceptions import LanguageNotSupportedException
+
+        try:
+            translator = self._translator(GOOGLE_LANGUAGE_CODES.get(source, source), target)
+        except LanguageNotSupportedException:
+            # fastText knows languages Google Translate does not; let Google detect those itself
+            translator = self._translator("auto", target)
+        return translator.translate(text)
+
+
+class TranslationService:
+
+    def __init__(self, backend, max_workers=4, cache_size=10000):
+        self.backend = backend
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)),
+                                            thread_name_prefix=f"translate-{backend.name}")
+        self._hits = 0
+        self._misses = 0
+
+    def _key(self, segment, source, target):
+        digest = hashlib.sha256(segment.encode("utf-8")).hexdigest()
+        return (digest, source, target, self.backend.name)
+
+    def _translate_segment(self, segment, source, target):
+        key = self._key(segment, source, target)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return cached
+            self._misses += 1
+        translated = self.backend.translate(segment, source, target)
+        with self._lock:
+            self._cache[key] = translated
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return translated
+
+    def _segments(self, text):
+        # (segment, translate?) pairs. Blank lines pass through as they are, so
+        # paragraph breaks survive and whitespace-only text comes back unchanged.
+        segments = []
+        paragraph = []
+        for line in text.split("\n") + [None]:
+            if line is not None and line.strip():
+                paragraph.append(line)
+                continue
+            for segment in split_segments(paragraph, self.backend.max_segment_tokens, self.backend.max_segment_chars):
+                segments.append((segment, True))
+            paragraph = []
+            if line is not None:
+                segments.append((line, False))
+        return segments
+
+    def translate(self, text, source="auto", target="en"):
+        return self.translate_batch([text], source=source, target=target)[0]
+
+    def translate_batch(self, texts, source="auto", target="en"):
+        # Every segment of every text goes to the pool at once; results are
+        # reassembled per text in their original order. `source` may be a
+        # single code or one code per text.
+        sources = source if isinstance(source, (list, tuple)) else [source] * len(texts)
+        futures = []
+        for text, text_source in zip(texts, sources):
+            futures.append([
+                self._executor.submit(self._translate_segment, segment, text_source, target) if translate else segment
+                for segment, translate in self._segments(text)
+            ])
+        return [
+            "\n".join(part if isinstance(part, str) else part.result() for part in text_futures)
+            for text_futures in futures
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "cache_entries": len(self._cache),
+                "cache_hits": self._hits,
+                "cache_misses": self._misses,
+            }
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+BACKENDS = {
+    "openai": OpenAITranslationBackend,
+    "google": GoogleTranslationBackend,
+}
+
+
+def get_translation_service(backend_name=None):
+    backend_name = (backend_name or os.getenv("TRANSLATION_BACKEND", "openai")).lower()
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend '{backend_name}'")
+    with _services_lock:
+        service = _services.get(backend_name)
+        if service is None:
+            service = TranslationService(
+                BACKENDS[backend_name](),
+                max_workers=int(os.getenv("TRANSLATION_CONCURRENCY", "4")),
+                cache_size=int(os.getenv("TRANSLATION_CACHE_SIZE", "10000")),
+            )
+            _services[backend_name] = service
+        return service
+
+
+def translation_stats():
+    with _services_lock:
+        services = dict(_services)
+    return {name: service.stats() for name, service in services.items()}
@@ -0,0 +1,110 @@
+import os
+from collections import namedtuple
+
+Turn = namedtuple("Turn", ["start", "end", "speaker"])
+# speaker is None when the batch packs turns from more than one speaker
+TurnBatch = namedtuple("TurnBatch", ["start", "end", "speaker", "turns"])
+
+
+def packing_options_from_env():
+    return {
+        "max_gap": float(os.getenv("TURN_MERGE_MAX_GAP", "1.0")),
+        "min_duration": float(os.getenv("TURN_MIN_DURATION", "0")),
+        "max_duration": float(os.getenv("TURN_MAX_DURATION", "30.0")),
+        "pack_speakers": os.getenv("TURN_PACK_SPEAKERS", "0").lower() in ("1", "true", "yes"),
+        "max_pack_duration": float(os.getenv("TURN_MAX_PACK_DURATION", "120.0")),
+    }
+
+
+def turns_from_diarization(diarization):
+    turns = [Turn(turn.start, turn.end, speaker) for turn, _, speaker in diarization.itertracks(yield_label=True)]
+    return sorted(turns, key=lambda turn: turn.start)
+
+
+def merge_turns(turns, max_gap=1.0, min_duration=0.0, max_duration=30.0):
+    # Glue consecutive turns of the same speaker together while the silence
+    # between them is at most `max_gap` and the result stays under
+    # `max_duration`. Turns still shorter than `min_duration` afterwards are
+    # dropped; that is opt-in, since short turns include real answers
+    # ("yes", "no", "ok") as well as backchannels ("mm").
+    merged = []
+    for turn in turns:
+        if merged:
+            last = merged[-1]
+            if (turn.speaker == last.speaker
+                    and turn.start - last.end <= max_gap
+                    and max(turn.end, last.end) - last.start <= max_duration):
+                merged[-1] = Turn(last.start, max(turn.end, last.end), last.speaker)
+                continue
+        merged.append(turn)
+    return [turn for turn in merged if turn.end - turn.start >= min_duration]
+
+
+def pack_turns(turns, max_pack_duration=120.0):
+    # Put several consecutive turns (any speaker) into one request as long as
+    # the span they cover fits in `max_pack_duration`. Words are mapped back to
+    # turns afterwards with split_batch_transcript.
+    batches = []
+    current = []
+    for turn in turns:
+        if current and turn.end - current[0].start > max_pack_duration:
+            batches.append(_make_batch(current))
+            current = []
+        current.append(turn)
+    if current:
+        batches.append(_make_batch(current))
+    return batches
+
+
+def _make_batch(turns):
+    speakers = set(turn.speaker for turn in turns)
+    speaker = turns[0].speaker if len(speakers) == 1 else None
+    return TurnBatch(turns[0].start, max(turn.end for turn in turns), speaker, list(turns))
+
+
+def plan_batches(turns, max_gap=1.0, min_duration=0.0, max_duration=30.0,
+                 pack_speakers=False, max_pack_duration=120.0):
+    if pack_speakers:
+        # Short turns are worth keeping when they ride along with their
+        # neighbours instead of costing a request of their own.
+        merged = merge_turns(turns, max_gap=max_gap, min_duration=0.0, max_duration=max_duration)
+        return pack_turns(merged, max_pack_duration=max_pack_duration)
+    merged = merge_turns(turns, max_gap=max_gap, min_duration=min_duration, max_duration=max_duration)
+    return [TurnBatch(turn.start, turn.end, turn.speaker, [turn]) for turn in merged]
+
+
+def needs_word_timestamps(batch):
+    return len(batch.turns) > 1
+
+
+def split_batch_transcript(batch, response):
+    # Returns [(turn, text)] for every turn in the batch. Single-turn batches
+    # take the plain text; packed batches use the verbose_json word (or
+    # segment) timings, which are relative to the start of the batch audio.
+    if not needs_word_timestamps(batch):
+        text = response if isinstance(response, str) else (response or {}).get('text', '')
+        return [(batch.turns[0], text)]
+
+    pieces = {index: [] for index in range(len(batch.turns))}
+    timed_items = []
+    if response and not isinstance(response, str):
+        timed_items = response.get('words') or response.get('segments') or []
+    for item in timed_items:
+        text = (item.get('word') or item.get('text') or '').strip()
+        if not text:
+            continue
+        midpoint = batch.start + (float(item.get('start', 0.0)) + float(item.get('end', 0.0))) / 2
+        pieces[_nearest_turn(batch.turns, midpoint)].append(text)
+    return [(turn, " ".join(pieces[index])) for index, turn in enumerate(batch.turns)]
+
+
+def _nearest_turn(turns, timestamp):
+    best_index = 0
+    best_distance = None
+    for index, turn in enumerate(turns):
+        if turn.start <= timestamp <= turn.end:
+            return index
+        distance = min(abs(timestamp - turn.start), abs(timestamp - turn.end))
+        if best_distance is None or distance < best_distance:
+            best_index, best_distance = index, distance
+    return best_index
@@ -0,0 +1,142 @@
+import bisect
+import os
+
+import numpy as np
+
+from audio_array import SplicedAudioArray
+
+FRAME_SECONDS = 0.03
+BLOCK_FRAMES = 10000
+
+
+def vad_options_from_env():
+    return {
+        "mode": os.getenv("VAD_MODE", "energy").lower(),
+        "aggressiveness": int(os.getenv("VAD_AGGRESSIVENESS", "2")),
+        "energy_floor_db": float(os.getenv("VAD_ENERGY_FLOOR_DB", "-50")),
+        "energy_margin_db": float(os.getenv("VAD_ENERGY_MARGIN_DB", "10")),
+        "padding": float(os.getenv("VAD_PADDING", "0.25")),
+        "min_silence": float(os.getenv("VAD_MIN_SILENCE", "1.0")),
+        "min_speech_ratio": float(os.getenv("VAD_MIN_SPEECH_RATIO", "0.2")),
+        "min_speech_seconds": float(os.getenv("VAD_MIN_SPEECH_SECONDS", "1.0")),
+    }
+
+
+def frame_levels_db(samples, frame_length):
+    # RMS level of each frame in dBFS, computed in blocks so a long memory-mapped
+    # recording is never converted to float all at once
+    frames = len(samples) // frame_length
+    levels = np.empty(frames, dtype=np.float32)
+    for first in range(0, frames, BLOCK_FRAMES):
+        last = min(frames, first + BLOCK_FRAMES)
+        block = samples[first * frame_length:last * frame_length].reshape(-1, frame_length).astype(np.float32) / 32768.0
+        levels[first:last] = 10 * np.log10(np.mean(block * block, axis=1) + 1e-10)
+    return levels
+
+
+def energy_speech_frames(samples, frame_length, floor_db=-50.0, margin_db=10.0):
+    levels = frame_levels_db(samples, frame_length)
+    if not len(levels):
+        return np.zeros(0, dtype=bool)
+    # Speech has to clear the recording's own noise floor by `margin_db`, but a
+    # noisy line never pushes the threshold above normal speaking levels, nor
+    # above halfway between its quiet (p10) and loud (p90) frames: on a phone
+    # line with noise at -40 dBFS and speech at -30 the margin alone would cut
+    # speech. Frames below `floor_db` are never speech.
+    noise, loud = (float(value) for value in np.percentile(levels, [10, 90]))
+    threshold = max(floor_db, min(noise + margin_db, (noise + loud) / 2, -25.0))
+    return levels > threshold
+
+
+def webrtc_speech_frames(samples, frame_length, sample_rate, aggressiveness=2):
+    import webrtcvad
+
+    detector = webrtcvad.Vad(max(0, min(3, aggressiveness)))
+    frames = len(samples) // frame_length
+    speech = np.zeros(frames, dtype=bool)
+    for index in range(frames):
+        frame = np.ascontiguousarray(samples[index * frame_length:(index + 1) * frame_length])
+        speech[index] = detector.is_speech(frame.tobytes(), sample_rate)
+    return speech
+
+
+def speech_regions(speech, padding_frames, min_silence_frames):
+    # Pads every speech run and only treats gaps of at least `min_silence_frames`
+    # as removable; returns (first_frame, last_frame) pairs, end exclusive
+    if not speech.any():
+        return []
+    padded = np.convolve(speech.astype(np.float32), np.ones(2 * padding_frames + 1), mode="same") > 0
+    edges = np.diff(np.concatenate(([0], padded.astype(np.int8), [0])))
+    regions = []
+    for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        if regions and start - regions[-1][1] < min_silence_frames:
+            regions[-1][1] = int(end)
+        else:
+            regions.append([int(start), int(end)])
+    return [tuple(region) for region in regions]
+
+
+class SpeechAudio:
+    # The speech-only version of a recording plus what is needed to relate it
+    # back: diarization and ASR run on `audio`, and original_time() turns a
+    # time in it into a time in the recording.
+
+    def __init__(self, audio, original_duration, regions=None, speech=None, frame_length=None):
+        self.audio = audio
+        self.original_duration = original_duration
+        self.speech = speech
+        self.frame_length = frame_length
+        self._trimmed_starts = []
+        self._original_starts = []
+        position = 0.0
+        for first, last in regions or []:
+            self._trimmed_starts.append(position)
+            self._original_starts.append(first * frame_length / audio.sample_rate)
+            position += (last - first) * frame_length / audio.sample_rate
+
+    @property
+    def seconds_trimmed(self):
+        return max(0.0, self.original_duration - self.audio.duration)
+
+    def original_time(self, seconds):
+        if not self._trimmed_starts:
+            return seconds
+        index = max(0, bisect.bisect_right(self._trimmed_starts, seconds) - 1)
+        return self._original_starts[index] + seconds - self._trimmed_starts[index]
+
+    def speech_ratio(self, start, end):
+        if self.speech is None:
+            return 1.0
+        frame_seconds = self.frame_length / float(self.audio.sample_rate)
+        first = int(start / frame_seconds)
+        last = max(first + 1, int(np.ceil(end / frame_seconds)))
+        window = self.speech[first:last]
+        return float(window.mean()) if len(window) else 0.0
+
+
+def detect_speech(audio, mode="energy", aggressiveness=2, energy_floor_db=-50.0, energy_margin_db=10.0,
+                  padding=0.25, min_silence=1.0, min_speech_seconds=1.0, **_):
+    # mode is "energy", "webrtc" (needs the webrtcvad package) or "off"
+    if mode == "off":
+        return SpeechAudio(audio, audio.duration)
+
+    frame_length = int(FRAME_SECONDS * audio.sample_rate)
+    if mode == "webrtc":
+        speech = webrtc_speech_frames(audio.samples, frame_length, audio.sample_rate, aggressiveness)
+    else:
+        speech = energy_speech_frames(audio.samples, frame_length, energy_floor_db, energy_margin_db)
+    if len(speech) and speech.sum() * frame_length / audio.sample_rate < min_speech_seconds:
+        # Next to no speech at all (a very quiet or unusual line): diarization gets the
+        # whole recording, while silent chunks are still dropped frame by frame
+        print(f"VAD found under {min_speech_seconds:g}s of speech in the recording; keeping all audio")
+        return SpeechAudio(audio, audio.duration, None, speech, frame_length)
+    regions = speech_regions(speech, int(round(padding / FRAME_SECONDS)), int(round(min_silence / FRAME_SECONDS)))
+    if regions == [(0, len(speech))]:
+        # Nothing worth cutting; keep the memory-mapped original rather than copying it
+        return SpeechAudio(audio, audio.duration, None, speech, frame_length)
+
+    # The kept regions stay views of the (memory-mapped) recording
+    pieces = [audio.samples[first * frame_length:last * frame_length] for first, last in regions]
+    trimmed_speech = np.concatenate([speech[first:last] for first, last in regions]) if regions else speech[:0]
+    return SpeechAudio(SplicedAudioArray(pieces, audio.sample_rate, audio.path), audio.duration,
+                       regions, trimmed_speech, frame_length)